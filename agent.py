@@ -4,23 +4,88 @@ import numpy as np
 from dotenv import load_dotenv
 from livekit.agents import Agent, AgentSession, JobContext, WorkerOptions, cli
 from livekit import rtc
-from llm import query_llm
-from escalation import escalate_question
-import logging
-import whisper
-from datetime import datetime
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("agent_debug.log"),
-        logging.StreamHandler()
-    ]
+from llm import (
+    query_llm, query_llm_stream, stream_sentences, get_scheduler, prewarm as prewarm_llm,
+    ChatSession, session_states,
+    answer_cache, FAILURE_REPLY, OVERLOAD_REPLY
 )
+from inference_scheduler import PRIORITY_BACKGROUND
+from escalation import escalate_question_async, get_outbox, get_pending_index
+from router import ROUTE_ESCALATE, ROUTE_LLM, get_router
+from segmenter import UtteranceSegmenter
+from whisper_stt import StreamingTranscriber
+from stt_service import get_stt_service
+from tts import get_tts_handler
+from metrics import REGISTRY, start_http_server
+from tracing import Turn, record_rtf, set_outcome, span, stage_summary
+from logging_config import LogSampler, dropped_records, setup_logging
+import logging
+import time
+
+# Handlers run on a background listener; see logging_config for LOG_LEVEL(S)
+setup_logging(log_file=os.getenv("AGENT_LOG_FILE", "agent_debug.log"))
 logger = logging.getLogger("salon_agent")
 load_dotenv()
 
+ESCALATION_PHRASES = ["i don't know", "check with", "supervisor"]
+ESCALATION_REPLY = "Let me check with my supervisor and get back to you."
+ERROR_REPLY = "I'm having some trouble answering that. Let me connect you with someone who can help."
+GREETING = "Hello! I'm Bella from Bella's Salon. How can I help you today?"
+FIXED_PHRASES = [GREETING, ESCALATION_REPLY, ERROR_REPLY, OVERLOAD_REPLY]
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # 0 disables the endpoint
+AUDIO_LATE_S = float(os.getenv("AUDIO_LATE_S", "0.5"))
+# Each idle process holds its own KV cache and STT activations; weights are shared via mmap
+AGENT_IDLE_PROCESSES = int(os.getenv("AGENT_IDLE_PROCESSES", "1"))
+AGENT_INIT_TIMEOUT_S = float(os.getenv("AGENT_INIT_TIMEOUT_S", "300"))
+
+AUDIO_FRAMES = REGISTRY.counter("frontdesk_audio_frames_total", "Caller audio frames received")
+AUDIO_LATE_FRAMES = REGISTRY.counter(
+    "frontdesk_audio_frames_late_total",
+    "Caller audio frames read more than AUDIO_LATE_S behind real time"
+)
+BARGE_INS = REGISTRY.counter("frontdesk_barge_ins_total", "Replies cancelled because the caller spoke over them")
+AUDIO_INGEST_LAG = REGISTRY.gauge(
+    "frontdesk_audio_ingest_lag_seconds",
+    "How far the most recently read caller audio is behind real time"
+)
+WORKER_READY = REGISTRY.gauge("frontdesk_worker_ready", "1 once models are loaded and calls can be taken")
+
+def _register_queue_gauges(stt_service):
+    REGISTRY.gauge("frontdesk_stt_queue_depth", "STT requests waiting for a batch",
+                   fn=lambda: stt_service.stats()["queue_depth"])
+    REGISTRY.gauge("frontdesk_llm_queue_depth", "LLM requests waiting for a worker",
+                   fn=lambda: get_scheduler().stats()["queue_depth"])
+    REGISTRY.gauge("frontdesk_llm_busy_workers", "LLM workers currently generating",
+                   fn=lambda: get_scheduler().stats()["busy_workers"])
+    REGISTRY.gauge("frontdesk_escalation_outbox_depth", "Escalations waiting to be written",
+                   fn=lambda: get_outbox().pending)
+    REGISTRY.gauge("frontdesk_llm_session_state_mb", "KV state saved for conversations in progress",
+                   fn=lambda: session_states.stats()["mb"])
+    REGISTRY.gauge("frontdesk_log_records_dropped", "Log records dropped because the log queue was full",
+                   fn=dropped_records)
+
+def prewarm(proc=None):
+    """Load STT, the LLM, fixed TTS phrases and escalation state before a call.
+
+    Runs once per job process (LiveKit's prewarm hook), so a call never pays
+    for model loading and SalonAgent only picks up the shared singletons.
+    """
+    start = time.perf_counter()
+    try:
+        get_stt_service()
+        prewarm_llm()
+        get_tts_handler().prerender(FIXED_PHRASES)
+        get_pending_index()
+        get_outbox()
+    except Exception as e:
+        logger.error(f"Worker prewarm failed: {e}")
+        raise
+    WORKER_READY.set(1)
+    if proc is not None:
+        proc.userdata["ready"] = True
+    logger.info(f"Worker ready in {time.perf_counter() - start:.1f}s")
+
 class SalonAgent(Agent):
     def __init__(self):
         super().__init__(
@@ -32,20 +97,50 @@ class SalonAgent(Agent):
         self._audio_task = None
         
         self.sample_rate = 16000
-        self.chunk_duration = 1.5
-        self.chunk_size = int(self.sample_rate * self.chunk_duration)
-        self.audio_buffer = bytearray()
+        self.segmenter = UtteranceSegmenter(
+            sample_rate=self.sample_rate,
+            energy_threshold=float(os.getenv("VAD_ENERGY_THRESHOLD", "500")),
+            hangover_ms=int(os.getenv("VAD_HANGOVER_MS", "600")),
+            max_utterance_s=float(os.getenv("VAD_MAX_UTTERANCE_S", "15")),
+        )
         
         try:
-            logger.info("Loading Whisper model...")
-            self.stt_model = whisper.load_model("base")
-            logger.info("Whisper model loaded successfully")
+            self.stt_model = get_stt_service()
         except Exception as e:
             logger.error(f"Failed to load Whisper model: {e}")
             raise
 
+        self.streaming_stt = os.getenv("STT_STREAMING", "1") == "1"
+        self.partial_interval = int(self.sample_rate * float(os.getenv("STT_PARTIAL_INTERVAL_S", "0.8")))
+        self.transcriber = StreamingTranscriber(self.stt_model, sample_rate=self.sample_rate)
+        self._partial_task = None
+        self._last_partial_at = 0
+        self._speculative_question = None
+        self._speculative_answer = None
+        self._finalizing = 0
+        # The transcriber carries one utterance's state at a time
+        self._stt_lock = asyncio.Lock()
+        
+        # Turns run as tasks so the ingest loop keeps reading (and can detect
+        # barge-in) while a reply is generated and spoken
+        self._turn_task = None
+        self._responding = None
+        self._carryover = ""
+        self.barge_ins = 0
+        self.barge_in = os.getenv("BARGE_IN", "1") == "1"
+        self.barge_in_samples = int(self.sample_rate * float(os.getenv("BARGE_IN_MIN_MS", "300")) / 1000)
+        self.streaming_llm = os.getenv("LLM_STREAMING", "1") == "1"
+        self.router = get_router()
+        # Conversation history and KV state for follow-up questions
+        self.chat = None
+        
+        self.tts = get_tts_handler()
+        self.tts.prerender(FIXED_PHRASES)
+        _register_queue_gauges(self.stt_model)
+
     async def on_connect(self, session: AgentSession):
         logger.info(f"Connected to room: {session.room.name}")
+        self.chat = ChatSession(session.room.name)
         
         participants = session.room.participants
         logger.debug(f"Current participants ({len(participants)}):")
@@ -61,7 +156,7 @@ class SalonAgent(Agent):
         else:
             logger.error("No audio track subscribed! Client must publish audio")
         
-        await session.audio.say("Hello! I'm Bella from Bella's Salon. How can I help you today?")
+        await self.tts.say(GREETING, session)
         logger.info("Initial greeting sent")
         
         self._audio_task = asyncio.create_task(self._audio_processing_loop(session))
@@ -70,6 +165,10 @@ class SalonAgent(Agent):
         logger.info("Starting audio processing loop")
         frames_received = 0
         bytes_received = 0
+        stream_start = None
+        audio_received = 0.0
+        frame_log = LogSampler(float(os.getenv("AUDIO_LOG_INTERVAL_S", "5")))
+        resample_logged = False
         
         try:
             while not self._should_disconnect.is_set():
@@ -86,32 +185,47 @@ class SalonAgent(Agent):
                     
                     if isinstance(frame, rtc.AudioFrame):
                         bytes_received += len(frame.data)
+                        AUDIO_FRAMES.inc()
+                        
+                        # Audio is real-time, so wall time since the first frame
+                        # minus audio received is how far behind the loop is
+                        now = time.perf_counter()
+                        if stream_start is None:
+                            stream_start = now
+                        lag = max(0.0, now - stream_start - audio_received)
+                        audio_received += frame.samples_per_channel / frame.sample_rate
+                        AUDIO_INGEST_LAG.set(lag)
+                        if lag > AUDIO_LATE_S:
+                            AUDIO_LATE_FRAMES.inc()
                         
-                        if frames_received % 10 == 0:
+                        if logger.isEnabledFor(logging.DEBUG) and frame_log.ready():
                             logger.debug(
-                                f"Audio frame #{frames_received}: "
-                                f"{len(frame.data)} bytes, "
-                                f"{frame.sample_rate}Hz, "
-                                f"{frame.num_channels} channels, "
-                                f"{frame.samples_per_channel} samples"
+                                "Audio frame #%d: %d bytes, %dHz, %d channels, %d samples, lag %.3fs",
+                                frames_received, len(frame.data), frame.sample_rate,
+                                frame.num_channels, frame.samples_per_channel, lag
                             )
                         
                         if frame.sample_rate != self.sample_rate or frame.num_channels > 1:
+                            if not resample_logged:
+                                logger.info(
+                                    "Resampling caller audio from %dHz/%d ch to %dHz mono",
+                                    frame.sample_rate, frame.num_channels, self.sample_rate
+                                )
+                                resample_logged = True
                             frame = frame.remix_and_resample(
                                 self.sample_rate,
                                 1
                             )
-                            logger.debug("Audio frame resampled to 16kHz mono")
                         
                         raw_samples = np.frombuffer(frame.data, dtype=np.int16)
-                        self.audio_buffer.extend(raw_samples.tobytes())
+                        for utterance in self.segmenter.push(raw_samples):
+                            self._start_turn(utterance, session)
                         
-                        while len(self.audio_buffer) >= self.chunk_size * 2:
-                            chunk = self.audio_buffer[:self.chunk_size * 2]
-                            self.audio_buffer = self.audio_buffer[self.chunk_size * 2:]
-                            
-                            samples = np.frombuffer(chunk, dtype=np.int16)
-                            await self._process_audio_chunk(samples, session)
+                        if self.barge_in and self._responding is not None and self._caller_speaking():
+                            self._interrupt_turn()
+                        
+                        if self.streaming_stt:
+                            self._maybe_update_partial()
 
                 except asyncio.TimeoutError:
                     continue
@@ -124,56 +238,297 @@ class SalonAgent(Agent):
         finally:
             logger.info(f"Audio processing ended. Received {frames_received} frames ({bytes_received} bytes)")
 
-    async def _process_audio_chunk(self, samples: np.ndarray, session: AgentSession):
+    def _caller_speaking(self) -> bool:
+        """True once the caller has said enough to count as a new utterance."""
+        return self.segmenter.voiced_samples >= self.barge_in_samples
+
+    def _start_turn(self, samples: np.ndarray, session: AgentSession):
+        """Hand a finished utterance to a new turn task without blocking ingest.
+
+        The partial decode belongs to this utterance, so it moves to the turn.
+        Turns transcribe immediately but reply one at a time, in order.
+        """
+        partial_task, self._partial_task = self._partial_task, None
+        self._last_partial_at = 0
+        self._finalizing += 1
+        previous = self._turn_task
+        self._turn_task = asyncio.create_task(
+            self._process_audio_chunk(samples, session, partial_task, previous)
+        )
+
+    def _interrupt_turn(self):
+        """Barge-in: cancel the reply in progress (generation and playback)."""
+        task, self._responding = self._responding, None
+        if task is not None and not task.done():
+            logger.info("Caller barged in; cancelling the current reply")
+            BARGE_INS.inc()
+            self.barge_ins += 1
+            task.cancel()
+
+    async def wait_until_idle(self):
+        """Wait for queued turns to finish replying (used by bench_calls)."""
+        while self._turn_task and not self._turn_task.done():
+            await asyncio.gather(self._turn_task, return_exceptions=True)
+
+    def _maybe_update_partial(self):
+        """Kick off a partial decode of the in-progress utterance if one is due."""
+        if self._partial_task and not self._partial_task.done():
+            return
+        # The transcriber holds the previous utterance's state until it is finalized
+        if self._finalizing:
+            return
+        utterance_samples = self.segmenter.utterance_samples
+        if utterance_samples - self._last_partial_at < self.partial_interval:
+            return
+        self._last_partial_at = utterance_samples
+        audio_float = self.segmenter.current_utterance().astype(np.float32) / 32768.0
+        self._partial_task = asyncio.create_task(self._update_partial(audio_float))
+
+    async def _update_partial(self, audio_float: np.ndarray):
         try:
-            logger.debug(f"Processing audio chunk ({len(samples)} samples)")
-            audio_float = samples.astype(np.float32) / 32768.0
-            start_time = datetime.now()
             loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, 
-                lambda: self.stt_model.transcribe(
-                    audio_float,
-                    language="en",
-                    fp16=False
-                )
+            committed, partial = await loop.run_in_executor(
+                None,
+                lambda: self.transcriber.update(audio_float)
             )
-            transcribe_time = (datetime.now() - start_time).total_seconds()
-            text = result["text"].strip()
-            if text:
-                logger.info(f"Transcription ({transcribe_time:.2f}s): '{text}'")
-                start_time = datetime.now()
-                response = await self._generate_response(text, session.room.name)
-                process_time = (datetime.now() - start_time).total_seconds()
-                logger.info(f"Generated response ({process_time:.2f}s): '{response}'")
-                await session.audio.say(response)
-            else:
-                logger.debug("No speech detected in audio chunk")
+            logger.debug("Partial transcript: committed='%s' partial='%s'", committed, partial)
+            
+            # A committed sentence is stable, so the LLM can start on it while
+            # the caller finishes; the result is used only if nothing follows it.
+            if committed and committed[-1] in ".?!" and committed != self._speculative_question:
+                if self._speculative_answer:
+                    self._speculative_answer.cancel()
+                    self._speculative_answer = None
+                self._speculative_question = committed
+                decision = self._route(committed)
+                # A follow-up needs the conversation, which a speculative answer doesn't get
+                follow_up = self.chat is not None and self.chat.turns
+                if not follow_up and (decision is None or decision.route == ROUTE_LLM):
+                    self._speculative_answer = asyncio.create_task(query_llm(committed, priority=PRIORITY_BACKGROUND))
+        except Exception as e:
+            logger.error(f"Partial transcription failed: {str(e)}")
+
+    def _take_speculative_answer(self, text: str):
+        """Return the speculative LLM task if it was started on exactly `text`."""
+        task, question = self._speculative_answer, self._speculative_question
+        self._speculative_answer = None
+        self._speculative_question = None
+        if task is None:
+            return None
+        if question == text:
+            logger.debug("Reusing speculative LLM answer")
+            return task
+        task.cancel()
+        return None
+
+    async def _process_audio_chunk(self, samples: np.ndarray, session: AgentSession,
+                                   partial_task=None, previous=None):
+        audio_seconds = len(samples) / self.sample_rate
+        decision = None
+        with Turn(session.room.name, audio_seconds=audio_seconds) as turn:
+            try:
+                logger.debug("Processing utterance (%.2fs)", audio_seconds)
+                audio_float = samples.astype(np.float32) / 32768.0
+                try:
+                    async with self._stt_lock:
+                        with span("buffer"):
+                            if partial_task:
+                                await partial_task
+                        loop = asyncio.get_event_loop()
+                        start = time.perf_counter()
+                        with span("stt"):
+                            text = await loop.run_in_executor(
+                                None,
+                                lambda: self.transcriber.finalize(audio_float)
+                            )
+                    record_rtf("stt", time.perf_counter() - start, audio_seconds)
+                    speculative = self._take_speculative_answer(text)
+                finally:
+                    self._finalizing -= 1
+                
+                if previous is not None and not previous.done():
+                    with span("wait_previous"):
+                        await asyncio.gather(previous, return_exceptions=True)
+                
+                if self._carryover:
+                    # The caller kept talking before we answered; treat it as one question
+                    text = f"{self._carryover} {text}".strip()
+                    self._carryover = ""
+                    # The speculative answer was for the second half alone
+                    if speculative:
+                        speculative.cancel()
+                    speculative = None
+                if text and self.barge_in and self._caller_speaking():
+                    self._carryover = text
+                    if speculative:
+                        speculative.cancel()
+                    set_outcome("merged")
+                    logger.info(f"Caller still speaking; holding '{text}' for the next utterance")
+                    return
                 
+                if text:
+                    logger.info(f"Transcription: '{text}'")
+                    self._responding = asyncio.current_task()
+                    with span("route"):
+                        decision = self._route(text)
+                    if decision is not None and decision.route != ROUTE_LLM:
+                        if speculative:
+                            speculative.cancel()
+                        await self._reply_without_llm(text, decision, session)
+                        return
+                    if self.streaming_llm and speculative is None:
+                        await self._stream_response(text, session)
+                        return
+                    response = await self._generate_response(text, session.room.name, speculative)
+                    logger.info(f"Generated response: '{response}'")
+                    await self.tts.say(response, session)
+                else:
+                    set_outcome("no_speech")
+                    logger.debug("No speech detected in audio chunk")
+                    
+            except asyncio.CancelledError:
+                set_outcome("interrupted")
+                raise
+            except Exception as e:
+                set_outcome("error")
+                logger.error(f"Audio chunk processing failed: {str(e)}")
+            finally:
+                if self._responding is asyncio.current_task():
+                    self._responding = None
+                if decision is not None:
+                    self.router.record(decision, session.room.name, turn.outcome)
+
+    def _route(self, question: str):
+        """Route `question` before generation; None (use the LLM) if routing fails."""
+        try:
+            return self.router.route(question, self.chat.last_question() if self.chat else "")
         except Exception as e:
-            logger.error(f"Audio chunk processing failed: {str(e)}")
+            logger.error(f"Routing failed for '{question}': {e}")
+            return None
+
+    async def _reply_without_llm(self, question: str, decision, session: AgentSession):
+        """Speak a learned answer, or escalate straight away, as the router decided."""
+        if decision.route == ROUTE_ESCALATE:
+            set_outcome("escalated")
+            logger.info(f"Escalating to supervisor before generation ({decision.reason})")
+            request_id = await escalate_question_async(question, session.room.name)
+            logger.info(f"Created help request ID: {request_id}")
+            await self.tts.say(ESCALATION_REPLY, session)
+            return
+        logger.info(f"Answering from learned answers: '{decision.answer}'")
+        if self.chat is not None:
+            self.chat.add_turn(question, decision.answer)
+        await self.tts.say(decision.answer, session)
 
-    async def _generate_response(self, question: str, caller_id: str) -> str:
+    async def _generate_response(self, question: str, caller_id: str, answer_task=None) -> str:
         try:
             logger.info(f"Processing question: '{question}'")
-            answer = await query_llm(question)
+            with span("llm"):
+                if answer_task is not None:
+                    answer = await answer_task
+                else:
+                    answer = await query_llm(question, session=self.chat)
             
-            if any(phrase in answer.lower() for phrase in ["i don't know", "check with", "supervisor"]):
+            if answer == OVERLOAD_REPLY:
+                await self._escalate_shed(question, caller_id)
+            elif any(phrase in answer.lower() for phrase in ESCALATION_PHRASES):
+                set_outcome("escalated")
                 logger.info("Escalating to supervisor")
-                request_id = escalate_question(question, caller_id)
+                request_id = await escalate_question_async(question, caller_id)
                 logger.info(f"Created help request ID: {request_id}")
-                return "Let me check with my supervisor and get back to you."
+                return ESCALATION_REPLY
+            elif answer_task is not None and self.chat is not None:
+                # query_llm records its own turns; the speculative answer was
+                # generated without the session, so record it once it's spoken
+                self.chat.add_turn(question, answer)
             
             return answer
         except Exception as e:
             logger.error(f"Question processing failed: {str(e)}")
-            escalate_question(question, caller_id)
-            return "I'm having some trouble answering that. Let me connect you with someone who can help."
+            set_outcome("error")
+            await escalate_question_async(question, caller_id)
+            return ERROR_REPLY
+
+    async def _escalate_shed(self, question: str, caller_id: str):
+        """Record a question shed under load and escalate it like any unanswered one."""
+        set_outcome("shed")
+        logger.info("LLM overloaded; escalating to supervisor")
+        request_id = await escalate_question_async(question, caller_id)
+        logger.info(f"Created help request ID: {request_id}")
+
+    async def _stream_response(self, question: str, session: AgentSession):
+        """Speak the LLM answer sentence by sentence while it is still being generated.
+
+        Each sentence is checked for escalation phrases (together with what was
+        already said) before it is spoken; on a match generation is stopped and
+        the caller hears the supervisor reply instead.
+        """
+        caller_id = session.room.name
+        said = ""
+        fallback = None
+        pieces = query_llm_stream(question, self.chat)
+        
+        async def until_fallback():
+            # The overload and failure replies arrive as one piece; catch them
+            # before they are split into sentences and half of one is spoken
+            nonlocal fallback
+            async for piece in pieces:
+                if piece in (OVERLOAD_REPLY, FAILURE_REPLY):
+                    fallback = piece
+                    return
+                yield piece
+        
+        async def escalate():
+            set_outcome("escalated")
+            logger.info("Escalating to supervisor")
+            request_id = await escalate_question_async(question, caller_id)
+            logger.info(f"Created help request ID: {request_id}")
+            await self.tts.say(ESCALATION_REPLY, session)
+        
+        try:
+            logger.info(f"Processing question (streaming): '{question}'")
+            async for sentence in stream_sentences(until_fallback()):
+                candidate = f"{said} {sentence}".strip()
+                if any(phrase in candidate.lower() for phrase in ESCALATION_PHRASES):
+                    await escalate()
+                    return
+                said = candidate
+                await self.tts.say(sentence, session)
+            if fallback == OVERLOAD_REPLY:
+                await self._escalate_shed(question, caller_id)
+                await self.tts.say(OVERLOAD_REPLY, session)
+                return
+            if fallback == FAILURE_REPLY:
+                await escalate()
+                return
+            logger.info(f"Streamed response: '{said}'")
+        except Exception as e:
+            logger.error(f"Question processing failed: {str(e)}")
+            set_outcome("error")
+            await escalate_question_async(question, caller_id)
+            await self.tts.say(ERROR_REPLY, session)
+        finally:
+            await pieces.aclose()
 
     async def on_disconnect(self):
         logger.info("Agent disconnecting...")
+        logger.info(f"STT service stats: {self.stt_model.stats()}")
+        logger.info(f"LLM scheduler stats: {get_scheduler().stats()}")
+        logger.info(f"Answer cache stats: {answer_cache.stats()}")
+        logger.info(f"Session KV state stats: {session_states.stats()}")
+        for stage, summary in stage_summary().items():
+            logger.info(
+                f"Stage {stage}: n={summary['count']} p50={summary['p50_s']:.3f}s "
+                f"p95={summary['p95_s']:.3f}s p99={summary['p99_s']:.3f}s"
+            )
         self._should_disconnect.set()
         
+        if self._turn_task and not self._turn_task.done():
+            self._turn_task.cancel()
+        
+        if self.chat is not None:
+            self.chat.close()
+        
         if self._audio_task:
             self._audio_task.cancel()
             try:
@@ -197,6 +552,13 @@ async def entrypoint(ctx: JobContext):
         )
         logger.info("LiveKit connected successfully")
         
+        if METRICS_PORT:
+            try:
+                start_http_server(METRICS_PORT)
+            except OSError as e:
+                # Another job process on this host already serves the port
+                logger.warning(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
+        
         agent = SalonAgent()
         session = AgentSession(agent=agent, room=ctx.room)
         await session.start()
@@ -210,4 +572,9 @@ async def entrypoint(ctx: JobContext):
         logger.info("Agent session ended")
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
+    cli.run_app(WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        num_idle_processes=AGENT_IDLE_PROCESSES,
+        initialize_process_timeout=AGENT_INIT_TIMEOUT_S
+    ))
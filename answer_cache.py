@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger("answer_cache")
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "frontdesk_answer_cache_requests_total", "Answer cache lookups by result", ["result"]
+)
+CACHE_SAVED_SECONDS = REGISTRY.counter(
+    "frontdesk_answer_cache_saved_seconds_total", "Generation time avoided by cache hits and coalescing"
+)
+
+
+class AnswerCache:
+    """LRU cache of generated answers with a TTL and single-flight coalescing.
+
+    Entries are tagged with a `version` (prompt, knowledge base and learned
+    answers); a lookup with a different version drops the whole cache, since
+    any answer may depend on what changed. While an answer is being
+    generated, identical questions wait on the same Future instead of
+    starting their own generation. Futures are concurrent.futures ones, so
+    callers on any event loop or thread can share them. Blank answers and
+    the `uncacheable` ones (fallback replies) are never stored or shared.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, uncacheable: Iterable[str] = ()):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.uncacheable = frozenset(uncacheable)
+        self._entries: "OrderedDict[Hashable, Tuple[str, float, float]]" = OrderedDict()
+        # key -> [future, number of followers waiting on it]
+        self._inflight: Dict[Hashable, list] = {}
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.saved_seconds = 0.0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Answer cache invalidated ({len(self._entries)} entries)")
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key: Hashable, version) -> Optional[str]:
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                answer, expires_at, generation_s = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_seconds += generation_s
+                    CACHE_REQUESTS.inc(result="hit")
+                    CACHE_SAVED_SECONDS.inc(generation_s)
+                    return answer
+                del self._entries[key]
+            self.misses += 1
+            CACHE_REQUESTS.inc(result="miss")
+            return None
+
+    def cacheable(self, answer: Optional[str]) -> bool:
+        return answer is not None and bool(answer.strip()) and answer not in self.uncacheable
+
+    def start(self, key: Hashable) -> Tuple[Future, bool]:
+        """Join the generation in flight for `key`, or become its leader.
+
+        Returns (future, is_leader). The leader must call `finish`; a
+        follower's future resolves to the answer, or None if the leader
+        produced no cacheable answer and the follower should generate itself.
+        """
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                flight[1] += 1
+                self.coalesced += 1
+                CACHE_REQUESTS.inc(result="coalesced")
+                return flight[0], False
+            future = Future()
+            self._inflight[key] = [future, 0]
+            return future, True
+
+    def finish(self, key: Hashable, future: Future, version, answer: Optional[str] = None,
+               error: Optional[BaseException] = None, generation_s: float = 0.0):
+        if not self.cacheable(answer):
+            # Followers generate for themselves rather than share it
+            answer = None
+        with self._lock:
+            followers = 0
+            flight = self._inflight.get(key)
+            if flight is not None and flight[0] is future:
+                del self._inflight[key]
+                followers = flight[1]
+            if answer is not None:
+                # Followers got the answer without generating it themselves
+                self.saved_seconds += generation_s * followers
+                CACHE_SAVED_SECONDS.inc(generation_s * followers)
+                if version == self._version:
+                    self._entries[key] = (answer, time.monotonic() + self.ttl, generation_s)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(answer)
+
+    async def get_or_compute(self, key: Hashable, version,
+                             compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """Cached answer for `key`, else one generation shared by concurrent callers.
+
+        `compute` returns the answer; None, blank and uncacheable answers are
+        returned to the leader but neither cached nor shared.
+        """
+        answer = self.get(key, version)
+        if answer is not None:
+            return answer
+        future, leader = self.start(key)
+        if not leader:
+            # Shielded so a cancelled follower doesn't cancel the shared future
+            answer = await asyncio.shield(asyncio.wrap_future(future))
+            if answer is not None:
+                return answer
+            return await compute()
+
+        start = time.perf_counter()
+        try:
+            answer = await compute()
+        except asyncio.CancelledError:
+            # The leader's caller went away; followers generate for themselves
+            self.finish(key, future, version)
+            raise
+        except Exception as e:
+            self.finish(key, future, version, error=e)
+            raise
+        self.finish(key, future, version, answer=answer, generation_s=time.perf_counter() - start)
+        return answer
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_s": self.saved_seconds,
+            }
@@ -1,12 +1,18 @@
-from flask import Flask, render_template, request, redirect, url_for
-from db import get_pending_requests, update_help_request, get_learned_answers
-from firebase_init import db
+from flask import Flask, Response, abort, g, render_template, request, redirect, url_for, jsonify
+from db import (
+    get_pending_requests, update_help_request, get_learned_answers,
+    expire_stale_requests, get_request_history
+)
+from storage import RequestNotPending, get_storage
 import os
 from dotenv import load_dotenv
 import logging
 import flask_socketio
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit
 from datetime import datetime
+from live_updates import ChangeCoalescer
+from metrics import CONTENT_TYPE, REGISTRY
+import time
 
 load_dotenv()
 
@@ -14,25 +20,99 @@ app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY")
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SWEEP_INTERVAL = int(os.getenv("EXPIRY_SWEEP_INTERVAL_S", "60"))
+
+coalescer = ChangeCoalescer(
+    lambda message: socketio.emit('requests_diff', message),
+    window=float(os.getenv("DASHBOARD_DEBOUNCE_S", "0.25"))
+)
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "frontdesk_http_request_seconds", "Dashboard request latency", ["endpoint", "status"]
+)
+EXPIRED_REQUESTS = REGISTRY.counter("frontdesk_requests_expired_total", "Help requests expired by the sweeper")
+REGISTRY.gauge("frontdesk_dashboard_diff_seq", "Sequence number of the last dashboard diff",
+               fn=lambda: coalescer.seq)
+
+def _request_summary(doc_id: str, data: dict) -> dict:
+    """The fields the pending list renders, JSON-safe."""
+    created_at = data.get("created_at")
+    expires_at = data.get("expires_at")
+    return {
+        "id": doc_id,
+        "caller_id": data.get("caller_id"),
+        "caller_count": len(data.get("caller_ids") or [data.get("caller_id")]),
+        "question": data.get("question"),
+        "created_at": created_at.isoformat() if created_at else None,
+        # The pending list is ordered by (expires_at, id)
+        "expires_at": expires_at.isoformat() if expires_at else None
+    }
+
 # Real-time updates
-def firebase_listener():
-    def callback(col_snapshot, changes, read_time):
-        for change in changes:
-            if change.type.name == 'ADDED':
-                socketio.emit('new_request', change.document.to_dict())
-            elif change.type.name == 'MODIFIED':
-                socketio.emit('update_request', change.document.to_dict())
+def requests_listener():
+    """Follow pending requests only; requests leaving the query are removals."""
+    initial = [True]
+
+    def callback(changes):
+        # The first callback is the current state, which pages already render
+        if initial[0]:
+            initial[0] = False
+            return
+        for op, doc_id, data in changes:
+            if op == 'remove':
+                coalescer.add('remove', doc_id)
+            else:
+                coalescer.add('upsert', doc_id, _request_summary(doc_id, data))
+
+    get_storage().watch_pending_requests(callback)
+    socketio.start_background_task(coalescer.run, socketio.sleep)
+
+def expiry_sweeper():
+    """Periodically expire stale pending requests, off the request path."""
+    while True:
+        EXPIRED_REQUESTS.inc(expire_stale_requests())
+        socketio.sleep(SWEEP_INTERVAL)
 
-    db.collection("help_requests").on_snapshot(callback)
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _observe_latency(response):
+    if "request_start" in g:
+        HTTP_SECONDS.observe(
+            time.perf_counter() - g.request_start,
+            endpoint=request.endpoint or "unmatched",
+            status=response.status_code
+        )
+    return response
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 @app.route("/")
 def index():
     return redirect(url_for("pending_requests"))
 
+def _page_size_arg(name: str) -> int:
+    """Page size from query arg `name`, clamped to 1..MAX_PAGE_SIZE; 400 if it isn't an integer."""
+    try:
+        value = int(request.args.get(name, PAGE_SIZE))
+    except ValueError:
+        abort(400, f"{name} must be an integer")
+    return max(1, min(value, MAX_PAGE_SIZE))
+
 @app.route("/requests")
 def pending_requests():
-    requests = get_pending_requests()
-    return render_template("requests.html", requests=requests)
+    limit = _page_size_arg("limit")
+    after = request.args.get("after")
+    requests = get_pending_requests(limit=limit, start_after=after)
+    next_after = requests[-1]["id"] if len(requests) == limit else None
+    return render_template("requests.html", requests=requests, after=after, next_after=next_after,
+                           limit=limit, epoch=coalescer.epoch, seq=coalescer.seq)
 
 @app.route("/respond/<request_id>", methods=["POST"])
 def respond(request_id):
@@ -40,17 +120,40 @@ def respond(request_id):
     if not answer:
         return "Answer is required", 400
     
-    update_help_request(request_id, answer)
-    socketio.emit('refresh')
+    try:
+        update_help_request(request_id, answer)
+    except RequestNotPending as e:
+        return f"{e}", 409
     return redirect(url_for("pending_requests"))
 
+def _history_page():
+    """Parse paging/filter args shared by the HTML and JSON history views."""
+    page_size = _page_size_arg("page_size")
+    filters = {
+        "status": request.args.get("status") or None,
+        "caller_id": request.args.get("caller_id") or None
+    }
+    requests, next_after = get_request_history(
+        page_size=page_size,
+        start_after=request.args.get("after"),
+        **filters
+    )
+    return requests, next_after, page_size, filters
+
 @app.route("/history")
 def request_history():
-    requests = db.collection("help_requests")\
-        .order_by("created_at", direction="DESCENDING")\
-        .stream()
-    return render_template("history.html", 
-                         requests=[{"id": doc.id, **doc.to_dict()} for doc in requests])
+    requests, next_after, page_size, filters = _history_page()
+    return render_template("history.html", requests=requests, next_after=next_after,
+                           page_size=page_size, filters=filters)
+
+@app.route("/api/history")
+def request_history_json():
+    requests, next_after, _, _ = _history_page()
+    for item in requests:
+        for field in ("created_at", "resolved_at"):
+            if item.get(field):
+                item[field] = item[field].isoformat()
+    return jsonify({"requests": requests, "next_after": next_after})
 
 @app.route("/learned")
 def learned_answers():
@@ -60,6 +163,18 @@ def learned_answers():
 def handle_connect():
     logging.info('Client connected')
 
+@socketio.on('sync')
+def handle_sync(data):
+    """Replay diffs a (re)connecting client missed, or tell it to reload."""
+    data = data or {}
+    messages = coalescer.since(data.get("epoch"), int(data.get("seq", 0)))
+    if messages is None:
+        emit('requests_reset')
+    else:
+        for message in messages:
+            emit('requests_diff', message)
+
 if __name__ == "__main__":
-    firebase_listener()  # Start real-time listener
+    requests_listener()  # Start real-time listener
+    socketio.start_background_task(expiry_sweeper)
     socketio.run(app, debug=True)
\ No newline at end of file
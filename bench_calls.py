@@ -0,0 +1,285 @@
+"""Offline call replay and concurrent-caller load test for SalonAgent.
+
+Each simulated caller is a SalonAgent driven by a fake AgentSession that
+plays a WAV file as the caller's microphone, at real time (--speed 1) or
+faster, then hangs up once every utterance has been answered. The caller
+keeps talking while replies play, so a reply that overlaps the next
+utterance is cut off by barge-in, as on a real call. Storage is a throwaway
+SQLite file and TTS renders silence of realistic length, so only STT and the
+LLM do real work; replies are "played" at the same pace as the caller audio.
+
+Reports per-stage latency percentiles (from the tracing histograms), turn
+and first-audio latency, STT real-time factor, CPU time, RSS and throughput
+as JSON. With --baseline, exits non-zero when a p95 regresses by more than
+--tolerance.
+
+    python bench_calls.py --calls benchmarks/stt_corpus --callers 4
+    python bench_calls.py --calls call.wav --callers 16 --speed 4 --json run.json
+    python bench_calls.py --calls call.wav --baseline last_release.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from bench_stt import SAMPLE_RATE, load_wav, synthesize_corpus
+
+FRAME_MS = 10
+
+logger = logging.getLogger("bench_calls")
+
+
+class FakeTTSEngine:
+    """Stand-in for Pyttsx3Engine: silence at ~14 characters per second."""
+
+    voice = "bench"
+    rate = 16000
+
+    def __init__(self, synth_rtf: float = 0.0):
+        self.synth_rtf = synth_rtf
+
+    def synthesize(self, text: str) -> Tuple[np.ndarray, int]:
+        duration = max(0.3, len(text) / 14.0)
+        if self.synth_rtf:
+            time.sleep(duration * self.synth_rtf)
+        return np.zeros(int(duration * self.rate), dtype=np.int16), self.rate
+
+
+class _FakeTrack:
+    sid = "TR_bench"
+    codec = "pcm"
+    sample_rate = SAMPLE_RATE
+    num_channels = 1
+
+
+class _FakeRoom:
+    def __init__(self, name: str):
+        self.name = name
+        self.participants = []
+
+
+class _FakeAudio:
+    """Feeds caller audio frame by frame and paces the agent's output."""
+
+    def __init__(self, audio: np.ndarray, speed: float, tail_s: float):
+        from livekit import rtc
+        self._rtc = rtc
+        samples = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        # Trailing silence lets the segmenter close the last utterance
+        self._samples = np.concatenate((samples, np.zeros(int(tail_s * SAMPLE_RATE), dtype=np.int16)))
+        self._frame_size = SAMPLE_RATE * FRAME_MS // 1000
+        self._position = 0
+        self._speed = speed
+        self._started_at = None
+        self.track = _FakeTrack()
+        self.finished = asyncio.Event()
+        self.frames_written = 0
+
+    async def read(self):
+        if self._position >= len(self._samples):
+            # The caller is done talking; replies may still be in progress
+            self.finished.set()
+            await asyncio.sleep(0.05)
+            return None
+        chunk = self._samples[self._position:self._position + self._frame_size]
+        self._position += self._frame_size
+        if self._speed:
+            # Frames arrive on the caller's clock; if the agent fell behind,
+            # the backlog is returned without waiting, as a real track would
+            loop = asyncio.get_event_loop()
+            if self._started_at is None:
+                self._started_at = loop.time()
+            available_at = self._started_at + self._position / SAMPLE_RATE / self._speed
+            await asyncio.sleep(max(0.0, available_at - loop.time()))
+        else:
+            await asyncio.sleep(0)
+        return self._rtc.AudioFrame(
+            data=chunk.tobytes(),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            samples_per_channel=len(chunk)
+        )
+
+    async def write_frame(self, frame):
+        self.frames_written += 1
+        if self._speed:
+            await asyncio.sleep(frame.samples_per_channel / frame.sample_rate / self._speed)
+        else:
+            await asyncio.sleep(0)
+
+
+class FakeSession:
+    def __init__(self, name: str, audio: np.ndarray, speed: float, tail_s: float):
+        self.room = _FakeRoom(name)
+        self.audio = _FakeAudio(audio, speed, tail_s)
+
+
+def load_calls(paths: List[Path]) -> List[Tuple[str, np.ndarray]]:
+    calls = []
+    for path in paths:
+        if path.is_dir():
+            # A transcript-only corpus such as benchmarks/stt_corpus
+            synthesize_corpus(path)
+        wavs = sorted(path.glob("*.wav")) if path.is_dir() else [path]
+        calls.extend((wav.name, load_wav(wav)) for wav in wavs)
+    return calls
+
+
+async def run_caller(agent_cls, index: int, name: str, audio: np.ndarray, args) -> dict:
+    await asyncio.sleep(index * args.stagger)
+    session = FakeSession(f"bench-{index}", audio, args.speed, args.tail)
+    agent = agent_cls()
+    start = time.perf_counter()
+    await agent.on_connect(session)
+    await session.audio.finished.wait()
+    await agent.wait_until_idle()
+    await agent.on_disconnect()
+    return {
+        "caller": index,
+        "call": name,
+        "audio_s": round(len(audio) / SAMPLE_RATE, 3),
+        "wall_s": round(time.perf_counter() - start, 3),
+        "frames_written": session.audio.frames_written,
+        "barge_ins": agent.barge_ins
+    }
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return None
+
+
+def _round(summary: dict) -> dict:
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in summary.items()}
+
+
+def collect_results(callers: List[dict], wall: float, cpu: float) -> dict:
+    from tracing import FIRST_AUDIO_SECONDS, REAL_TIME_FACTOR, TURN_SECONDS, stage_summary
+
+    turns = {labels["outcome"]: _round(TURN_SECONDS.summary(**labels)) for labels in TURN_SECONDS.label_values()}
+    total_turns = sum(summary["count"] for summary in turns.values())
+    audio = sum(caller["audio_s"] for caller in callers)
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "callers": len(callers),
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "cpu_utilization": round(cpu / wall, 3) if wall else None,
+        "rss_mb": round(_rss_mb() or 0.0, 1),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+        "throughput": {
+            "turns_per_min": round(total_turns / wall * 60, 2) if wall else None,
+            "calls_per_min": round(len(callers) / wall * 60, 2) if wall else None,
+            "audio_s_per_s": round(audio / wall, 3) if wall else None
+        },
+        "turns": turns,
+        "first_audio": _round(FIRST_AUDIO_SECONDS.summary()),
+        "stages": {stage: _round(summary) for stage, summary in stage_summary().items()},
+        "rtf": {labels["stage"]: _round(REAL_TIME_FACTOR.summary(**labels))
+                for labels in REAL_TIME_FACTOR.label_values()},
+        "per_caller": callers
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """p95 latencies that got worse than the baseline by more than `tolerance`."""
+    pairs = [("first_audio", results["first_audio"], baseline.get("first_audio", {}))]
+    for outcome, summary in results["turns"].items():
+        pairs.append((f"turn:{outcome}", summary, baseline.get("turns", {}).get(outcome, {})))
+    for stage, summary in results["stages"].items():
+        pairs.append((f"stage:{stage}", summary, baseline.get("stages", {}).get(stage, {})))
+
+    regressions = []
+    for name, current, previous in pairs:
+        now, before = current.get("p95_s"), previous.get("p95_s")
+        if now is not None and before and now > before * (1 + tolerance):
+            regressions.append(f"{name} p95 {before:.3f}s -> {now:.3f}s")
+    return regressions
+
+
+async def run(args, calls):
+    from agent import SalonAgent, prewarm
+
+    prewarm_start = time.perf_counter()
+    prewarm()
+    prewarm_s = time.perf_counter() - prewarm_start
+
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    callers = await asyncio.gather(*(
+        run_caller(SalonAgent, i, *calls[i % len(calls)], args)
+        for i in range(args.callers)
+    ))
+    results = collect_results(list(callers), time.perf_counter() - start_wall, time.process_time() - start_cpu)
+    results["prewarm_s"] = round(prewarm_s, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=Path, nargs="+", required=True, help="WAV files or directories of them")
+    parser.add_argument("--callers", type=int, default=1, help="simultaneous simulated callers")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed; 0 = as fast as possible")
+    parser.add_argument("--stagger", type=float, default=0.5, help="seconds between caller start times")
+    parser.add_argument("--tail", type=float, default=2.0, help="seconds of silence after each call")
+    parser.add_argument("--tts-rtf", type=float, default=0.0, help="simulated TTS synthesis cost")
+    parser.add_argument("--json", type=Path, help="write results to this file (default: stdout)")
+    parser.add_argument("--baseline", type=Path, help="results JSON to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--router-log", type=Path, help="write routing decisions here (see router.py)")
+    args = parser.parse_args()
+
+    # Stand-ins must be configured before agent/llm are imported
+    db_dir = tempfile.mkdtemp(prefix="bench_calls_")
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.join(db_dir, "frontdesk.db")
+    os.environ.setdefault("METRICS_PORT", "0")
+    os.environ.setdefault("AGENT_LOG_FILE", "")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["ROUTER_LOG_PATH"] = str(args.router_log or "")
+
+    import tts
+    tts._handler = tts.TTSHandler(engine=FakeTTSEngine(args.tts_rtf))
+
+    calls = load_calls(args.calls)
+    if not calls:
+        raise SystemExit(f"No WAV files found in {', '.join(map(str, args.calls))}")
+
+    results = asyncio.run(run(args, calls))
+    results["config"] = {
+        "callers": args.callers,
+        "speed": args.speed,
+        "calls": [name for name, _ in calls],
+        "stt_backend": os.getenv("STT_BACKEND", "whisper"),
+        "stt_model": os.getenv("STT_MODEL", "base"),
+        "llm_workers": os.getenv("LLM_WORKERS", "1")
+    }
+
+    output = json.dumps(results, indent=2, default=str)
+    if args.json:
+        args.json.write_text(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
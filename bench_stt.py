@@ -0,0 +1,205 @@
+"""Accuracy/speed benchmark for the STT backends.
+
+Runs every backend over a corpus of WAV files, each with a sibling .txt
+holding the reference transcript, and reports word error rate and real-time
+factor (processing time / audio duration; below 1.0 is faster than real time).
+Transcripts without a recorded clip get one synthesized with the local
+pyttsx3 voice plus seeded line noise (see synthesize_corpus).
+
+    python bench_stt.py --backends whisper,whisper-int8,faster-whisper
+    python bench_stt.py --corpus path/to/wavs --json results.json
+"""
+import argparse
+import json
+import logging
+import re
+import time
+import wave
+import zlib
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+from scipy.signal import resample_poly
+
+from stt_backends import BACKENDS, load_backend
+
+SAMPLE_RATE = 16000
+DEFAULT_CORPUS = Path(__file__).parent / "benchmarks" / "stt_corpus"
+# Synthesized clips: signal-to-noise ratio of the added line noise, and the
+# noise-only lead-in/tail so endpointing has silence to find
+SYNTH_SNR_DB = 20.0
+SYNTH_PAD_S = 0.5
+
+logger = logging.getLogger("bench_stt")
+
+
+def load_wav(path: Path) -> np.ndarray:
+    """Read a 16-bit PCM WAV as 16 kHz mono float32."""
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        channels = wav.getnchannels()
+        rate = wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    audio = samples.astype(np.float32) / 32768.0
+    if rate != SAMPLE_RATE:
+        audio = resample_poly(audio, SAMPLE_RATE, rate).astype(np.float32)
+    return audio
+
+
+def write_wav(path: Path, audio: np.ndarray):
+    """Write 16 kHz mono float32 audio as 16-bit PCM."""
+    samples = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+
+
+def synthesize_corpus(corpus: Path, snr_db: float = SYNTH_SNR_DB) -> int:
+    """Render a `<name>.wav` for each `<name>.txt` in `corpus` that lacks one.
+
+    Speech comes from pyttsx3 (the engine the agent speaks with) at a
+    caller's pace, padded and mixed with white noise seeded from the clip
+    name, so the same machine always produces the same clips. Recorded clips
+    are never overwritten. Returns the number of clips written.
+    """
+    from tts import Pyttsx3Engine
+
+    engine = None
+    written = 0
+    for ref_path in sorted(corpus.glob("*.txt")):
+        wav_path = ref_path.with_suffix(".wav")
+        if wav_path.exists():
+            continue
+        if engine is None:
+            engine = Pyttsx3Engine(rate=160)
+        samples, rate = engine.synthesize(ref_path.read_text().strip())
+        speech = samples.astype(np.float32) / 32768.0
+        if rate != SAMPLE_RATE:
+            speech = resample_poly(speech, SAMPLE_RATE, rate).astype(np.float32)
+        pad = np.zeros(int(SYNTH_PAD_S * SAMPLE_RATE), dtype=np.float32)
+        audio = np.concatenate([pad, speech, pad])
+
+        rng = np.random.default_rng(zlib.crc32(ref_path.stem.encode()))
+        speech_power = float(np.mean(speech ** 2)) or 1e-6
+        noise_rms = (speech_power / 10 ** (snr_db / 10)) ** 0.5
+        write_wav(wav_path, audio + rng.normal(0.0, noise_rms, len(audio)).astype(np.float32))
+        written += 1
+    if written:
+        logger.info(f"Synthesized {written} clip(s) in {corpus}")
+    return written
+
+
+def normalize_words(text: str) -> List[str]:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_errors(reference: List[str], hypothesis: List[str]) -> int:
+    """Word-level Levenshtein distance (substitutions + insertions + deletions)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def load_corpus(corpus: Path) -> List[Tuple[str, np.ndarray, str]]:
+    items = []
+    for wav_path in sorted(corpus.glob("*.wav")):
+        ref_path = wav_path.with_suffix(".txt")
+        if not ref_path.exists():
+            logger.warning(f"Skipping {wav_path.name}: no reference transcript")
+            continue
+        items.append((wav_path.name, load_wav(wav_path), ref_path.read_text().strip()))
+    return items
+
+
+def run_backend(name: str, corpus: List[Tuple[str, np.ndarray, str]]) -> dict:
+    load_start = time.perf_counter()
+    backend = load_backend(name)
+    load_time = time.perf_counter() - load_start
+
+    # Warm-up so one-off allocation/JIT cost doesn't land on the first clip
+    backend.transcribe(corpus[0][1], language="en")
+
+    total_errors = total_words = 0
+    total_audio = total_time = 0.0
+    clips = []
+    for clip_name, audio, reference in corpus:
+        start = time.perf_counter()
+        hypothesis = backend.transcribe(audio, language="en")["text"].strip()
+        elapsed = time.perf_counter() - start
+
+        ref_words = normalize_words(reference)
+        errors = word_errors(ref_words, normalize_words(hypothesis))
+        duration = len(audio) / SAMPLE_RATE
+        total_errors += errors
+        total_words += len(ref_words)
+        total_audio += duration
+        total_time += elapsed
+        clips.append({
+            "clip": clip_name,
+            "duration_s": round(duration, 3),
+            "time_s": round(elapsed, 3),
+            "wer": round(errors / max(1, len(ref_words)), 4),
+            "hypothesis": hypothesis
+        })
+
+    return {
+        "backend": name,
+        "load_time_s": round(load_time, 2),
+        "clips": len(clips),
+        "audio_s": round(total_audio, 2),
+        "wer": round(total_errors / max(1, total_words), 4),
+        "rtf": round(total_time / total_audio, 4) if total_audio else None,
+        "per_clip": clips
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--json", type=Path, help="write full results to this file")
+    parser.add_argument("--no-synthesize", action="store_true",
+                        help="only use recorded clips; don't synthesize missing ones")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not args.no_synthesize:
+        try:
+            synthesize_corpus(args.corpus)
+        except ImportError as e:
+            logger.error(f"Can't synthesize missing clips: {e}")
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        raise SystemExit(f"No WAV/transcript pairs found in {args.corpus}")
+
+    results = []
+    for name in args.backends.split(","):
+        try:
+            results.append(run_backend(name.strip(), corpus))
+        except ImportError as e:
+            logger.error(f"Skipping backend '{name}': {e}")
+
+    print(f"{'backend':<16}{'WER':>8}{'RTF':>8}{'load s':>8}")
+    for result in results:
+        print(f"{result['backend']:<16}{result['wer']:>8.3f}{result['rtf']:>8.3f}{result['load_time_s']:>8.1f}")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
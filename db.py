@@ -1,81 +1,105 @@
-from firebase_init import db
+from storage import get_storage
+from learned_index import normalize
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger("firebase_db")
 REQUEST_TIMEOUT = timedelta(minutes=30)
+BATCH_LIMIT = 500  # Firestore's maximum writes per batch
+HISTORY_FIELDS = ["caller_id", "question", "status", "created_at", "resolved_at"]
+
+def question_key(question: str) -> str:
+    """Normalized question text; pending requests with the same key are duplicates."""
+    return " ".join(normalize(question))
+
+def new_help_request(question: str, caller_id: str) -> dict:
+    now = datetime.utcnow()
+    return {
+        "question": question,
+        "question_key": question_key(question),
+        "caller_id": caller_id,
+        "caller_ids": [caller_id],
+        "status": "pending",
+        "created_at": now,
+        "expires_at": now + REQUEST_TIMEOUT,
+        "last_updated": now
+    }
 
 def create_help_request(question: str, caller_id: str) -> str:
     try:
-        doc_ref = db.collection("help_requests").add({
-            "question": question,
-            "caller_id": caller_id,
-            "status": "pending",
-            "created_at": datetime.utcnow(),
-            "expires_at": datetime.utcnow() + REQUEST_TIMEOUT,
-            "last_updated": datetime.utcnow()
-        })
-        logger.info(f"Created help request ID: {doc_ref[1].id}")
-        return doc_ref[1].id
+        storage = get_storage()
+        request_id = storage.new_id()
+        storage.add_help_request(request_id, new_help_request(question, caller_id))
+        logger.info(f"Created help request ID: {request_id}")
+        return request_id
     except Exception as e:
         logger.error(f"Failed to create help request: {e}")
         raise
 
-def get_pending_requests():
+def get_pending_requests(limit: int = 50, start_after: str = None):
+    """Unexpired pending requests, soonest to expire first.
+
+    Uses the (status, expires_at) index; `start_after` is the id of
+    the last request on the previous page. Expiring stale requests is left to
+    expire_stale_requests so page loads never write.
+    """
     try:
-        now = datetime.utcnow()
-        requests = []
-        
-        pending = db.collection("help_requests") \
-            .where("status", "==", "pending") \
-            .stream()
-        
-        for doc in pending:
-            data = doc.to_dict()
-            if data.get("expires_at", now) > now:
-                requests.append({"id": doc.id, **data})
-            else:
-                db.collection("help_requests").document(doc.id).update({
-                    "status": "expired",
-                    "last_updated": datetime.utcnow()
-                })
-        
-        return requests
+        return get_storage().pending_requests(datetime.utcnow(), limit, start_after)
     except Exception as e:
         logger.error(f"Failed to get pending requests: {e}")
         return []
 
-def update_help_request(request_id: str, answer: str):
+def get_request_history(page_size: int = 50, start_after: str = None,
+                        status: str = None, caller_id: str = None):
+    """One page of help requests, newest first, with only HISTORY_FIELDS.
+
+    `start_after` is the id of the last request on the previous page; its
+    created_at (plus the id, as a tie-breaker) is the cursor. Returns
+    (requests, next_cursor), next_cursor None on the last page.
+    """
     try:
-        db.collection("help_requests").document(request_id).update({
-            "answer": answer,
-            "status": "resolved",
-            "resolved_at": datetime.utcnow(),
-            "last_updated": datetime.utcnow()
-        })
+        requests = get_storage().request_history(page_size, HISTORY_FIELDS, start_after, status, caller_id)
+        next_cursor = requests[-1]["id"] if len(requests) == page_size else None
+        return requests, next_cursor
+    except Exception as e:
+        logger.error(f"Failed to get request history: {e}")
+        return [], None
+
+def expire_stale_requests() -> int:
+    """Mark pending requests past expires_at as expired, BATCH_LIMIT per write batch."""
+    expired = 0
+    try:
+        storage = get_storage()
+        while True:
+            count = storage.expire_stale_requests(datetime.utcnow(), BATCH_LIMIT)
+            expired += count
+            if count < BATCH_LIMIT:
+                break
         
-        request = db.collection("help_requests").document(request_id).get().to_dict()
-        db.collection("learned_answers").add({
-            "question": request["question"],
-            "answer": answer,
-            "learned_at": datetime.utcnow(),
-            "source_request": request_id
-        })
+        if expired:
+            logger.info(f"Expired {expired} stale help requests")
+        return expired
+    except Exception as e:
+        logger.error(f"Failed to expire stale requests: {e}")
+        return expired
+
+def update_help_request(request_id: str, answer: str):
+    """Answer a help request, its attached callers and any pending duplicates in one write."""
+    try:
+        callers = get_storage().resolve_help_request(request_id, answer, datetime.utcnow())
         
-        logger.info(f"Updated help request {request_id} and added to knowledge base")
+        logger.info(
+            f"Updated help request {request_id} and added to knowledge base "
+            f"({len(callers)} caller(s): {', '.join(callers)})"
+        )
+        return callers
     except Exception as e:
         logger.error(f"Failed to update help request: {e}")
         raise
 
 def get_learned_answers(limit: int = 50):
     try:
-        return [
-            {"id": doc.id, **doc.to_dict()}
-            for doc in db.collection("learned_answers")
-                .order_by("learned_at", direction="DESCENDING")
-                .limit(limit)
-                .stream()
-        ]
+        return get_storage().learned_answers(limit)
     except Exception as e:
         logger.error(f"Failed to get learned answers: {e}")
         return []
\ No newline at end of file
@@ -1,36 +1,244 @@
+import asyncio
 import logging
-from db import create_help_request
+import os
+import queue
+import threading
+import time
+from db import new_help_request, question_key
 from datetime import datetime
-from firebase_init import db
+from typing import Dict, Optional
+from metrics import REGISTRY
+from retrieval import content_words
+from storage import get_storage
+from tracing import span
 
 logger = logging.getLogger("escalation")
 
+ESCALATION_DEDUP = os.getenv("ESCALATION_DEDUP", "1") == "1"
+DEDUP_SIMILARITY = float(os.getenv("ESCALATION_DEDUP_SIMILARITY", "0.8"))
+
+ESCALATIONS = REGISTRY.counter(
+    "frontdesk_escalations_total", "Escalations by whether they created a request or joined a pending one",
+    ["result"]
+)
+
+class PendingRequestIndex:
+    """Pending help requests, followed through a storage watch, for spotting duplicates.
+
+    A question matches the pending request with the same question_key or,
+    failing that, the one whose content words overlap it most (Jaccard), if
+    the overlap reaches `similarity`. Requests created by this process are
+    added straight away, so a burst of the same question coalesces before the
+    watch catches up.
+    """
+
+    def __init__(self, similarity: float = DEDUP_SIMILARITY):
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._keys: Dict[str, str] = {}
+        self._words: Dict[str, frozenset] = {}
+        self._by_key: Dict[str, str] = {}
+        self._watch = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def start(self, storage):
+        self._watch = storage.watch_pending_requests(self._apply_changes)
+
+    def add(self, request_id: str, question: str):
+        key = question_key(question)
+        if not key:
+            return
+        with self._lock:
+            self._keys[request_id] = key
+            self._words[request_id] = frozenset(content_words(question))
+            self._by_key.setdefault(key, request_id)
+
+    def remove(self, request_id: str):
+        with self._lock:
+            key = self._keys.pop(request_id, None)
+            self._words.pop(request_id, None)
+            if key is not None and self._by_key.get(key) == request_id:
+                del self._by_key[key]
+                for other_id, other_key in self._keys.items():
+                    if other_key == key:
+                        self._by_key[key] = other_id
+                        break
+
+    def match(self, question: str) -> Optional[str]:
+        """Id of a pending request asking the same thing, or None."""
+        key = question_key(question)
+        if not key:
+            return None
+        words = frozenset(content_words(question))
+        with self._lock:
+            request_id = self._by_key.get(key)
+            if request_id is not None or not words:
+                return request_id
+            best_id, best_score = None, 0.0
+            for other_id, other_words in self._words.items():
+                if not other_words:
+                    continue
+                score = len(words & other_words) / len(words | other_words)
+                if score > best_score:
+                    best_id, best_score = other_id, score
+        return best_id if best_score >= self.similarity else None
+
+    def _apply_changes(self, changes):
+        for op, doc_id, data in changes:
+            if op == "remove":
+                self.remove(doc_id)
+            else:
+                self.add(doc_id, data.get("question", ""))
+
+_pending_index: Optional[PendingRequestIndex] = None
+_pending_index_lock = threading.Lock()
+
+def get_pending_index() -> Optional[PendingRequestIndex]:
+    """Process-wide pending request index (None when ESCALATION_DEDUP=0)."""
+    global _pending_index
+    if not ESCALATION_DEDUP:
+        return None
+    with _pending_index_lock:
+        if _pending_index is None:
+            _pending_index = PendingRequestIndex()
+            _pending_index.start(get_storage())
+        return _pending_index
+
+def _escalation_writes(question: str, caller_id: str):
+    """Pre-allocate the request id and build the help request + notification pair.
+
+    When the same question is already pending, the writes attach the caller
+    to that request instead; the new request is only written if it has been
+    resolved or expired in the meantime. Returns (expected request id, writes).
+    """
+    request_id = get_storage().new_id()
+    notification = {
+        "type": "help_request",
+        "request_id": request_id,
+        "caller_id": caller_id,
+        "question": question,
+        "timestamp": datetime.utcnow(),
+        "status": "unread"
+    }
+    index = get_pending_index()
+    attach_to = index.match(question) if index is not None else None
+    if index is not None and attach_to is None:
+        index.add(request_id, question)
+    writes = (request_id, new_help_request(question, caller_id), notification, attach_to)
+    return attach_to or request_id, writes
+
+def _commit(writes) -> str:
+    """Apply the writes and return the id of the request the caller ended up on.
+
+    Ids are fixed and attaching a caller twice is a no-op, so retrying is idempotent.
+    """
+    request_id, request, notification, attach_to = writes
+    storage = get_storage()
+    with span("escalation_write"):
+        if attach_to is not None:
+            if storage.attach_caller(attach_to, request["caller_id"], datetime.utcnow()):
+                ESCALATIONS.inc(result="attached")
+                logger.info(f"Caller {request['caller_id']} joined pending help request {attach_to}")
+                return attach_to
+            logger.info(f"Help request {attach_to} is no longer pending; creating {request_id}")
+            index = get_pending_index()
+            if index is not None:
+                index.remove(attach_to)
+                index.add(request_id, request["question"])
+        storage.add_help_request(request_id, request, notification)
+    ESCALATIONS.inc(result="created")
+    _log_notification(request_id, request["question"], request["caller_id"])
+    return request_id
+
+def _log_notification(request_id: str, question: str, caller_id: str):
+    log_msg = (
+        f"\n=== SUPERVISOR NOTIFICATION ===\n"
+        f"New help request ({request_id})\n"
+        f"Caller: {caller_id}\n"
+        f"Question: {question}\n"
+        f"Time: {datetime.utcnow().isoformat()}\n"
+        f"Please respond at http://localhost:5000/respond/{request_id}\n"
+        f"============================="
+    )
+    logger.info(log_msg)
+
 def escalate_question(question: str, caller_id: str) -> str:
     """Escalate question to supervisor with proper logging and real-time update."""
     try:
-        request_id = create_help_request(question, caller_id)
-        
-        db.collection("notifications").add({
-            "type": "help_request",
-            "request_id": request_id,
-            "caller_id": caller_id,
-            "question": question,
-            "timestamp": datetime.utcnow(),
-            "status": "unread"
-        })
-        
-        log_msg = (
-            f"\n=== SUPERVISOR NOTIFICATION ===\n"
-            f"New help request ({request_id})\n"
-            f"Caller: {caller_id}\n"
-            f"Question: {question}\n"
-            f"Time: {datetime.utcnow().isoformat()}\n"
-            f"Please respond at http://localhost:5000/respond/{request_id}\n"
-            f"============================="
-        )
-        
-        logger.info(log_msg)
-        return request_id
+        _, writes = _escalation_writes(question, caller_id)
+        return _commit(writes)
     except Exception as e:
         logger.error(f"Failed to escalate question: {e}")
-        raise
\ No newline at end of file
+        raise
+
+class EscalationOutbox:
+    """In-process outbox that commits escalations from a background thread.
+
+    Entries are retried with exponential backoff (capped at `max_delay`) until
+    they commit or `max_attempts` is used up, so a storage blip delays the
+    supervisor notification instead of losing it or stalling the call.
+    """
+
+    def __init__(self, max_attempts: int = 10, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self.committed = 0
+        self.retries = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="escalation-outbox", daemon=True)
+        self._thread.start()
+
+    def put(self, request_id: str, question: str, caller_id: str, writes):
+        self._queue.put((request_id, question, caller_id, writes))
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            request_id, question, caller_id, writes = self._queue.get()
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    _commit(writes)
+                    self.committed += 1
+                    break
+                except Exception as e:
+                    if attempt == self.max_attempts:
+                        self.failed += 1
+                        logger.error(
+                            f"Giving up on escalation {request_id} after {attempt} attempts: {e} "
+                            f"(caller={caller_id}, question={question!r})"
+                        )
+                        break
+                    self.retries += 1
+                    delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                    logger.warning(f"Escalation {request_id} write failed ({e}); retrying in {delay:.1f}s")
+                    time.sleep(delay)
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_outbox() -> EscalationOutbox:
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = EscalationOutbox()
+        return _outbox
+
+async def escalate_question_async(question: str, caller_id: str) -> str:
+    """Queue an escalation and return its request id without waiting on storage.
+
+    The writes are prepared off the event loop: the first escalation in a
+    process may still have to connect to storage and load the pending
+    request index (agent prewarm does both ahead of time).
+    """
+    loop = asyncio.get_running_loop()
+    with span("escalation"):
+        request_id, writes = await loop.run_in_executor(None, _escalation_writes, question, caller_id)
+        get_outbox().put(request_id, question, caller_id, writes)
+    return request_id
@@ -3,6 +3,7 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from dotenv import load_dotenv
 import os
+import threading
 
 load_dotenv()
 
@@ -12,9 +13,22 @@ def get_credentials_path():
         return raw_path.encode('unicode-escape').decode()
     return raw_path
 
-if not firebase_admin._apps:
-    cred_path = get_credentials_path()
-    cred = credentials.Certificate(cred_path)
-    firebase_app = firebase_admin.initialize_app(cred)
-    
-db = firestore.client()
\ No newline at end of file
+_db = None
+_db_lock = threading.Lock()
+
+def get_db():
+    """Firestore client, connecting on first use rather than at import."""
+    global _db
+    with _db_lock:
+        if _db is None:
+            if not firebase_admin._apps:
+                cred = credentials.Certificate(get_credentials_path())
+                firebase_admin.initialize_app(cred)
+            _db = firestore.client()
+        return _db
+
+def __getattr__(name):
+    # Keeps `from firebase_init import db` working, lazily
+    if name == "db":
+        return get_db()
+    raise AttributeError(f"module 'firebase_init' has no attribute '{name}'")
\ No newline at end of file
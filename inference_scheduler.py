@@ -0,0 +1,211 @@
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Deque, Optional
+
+logger = logging.getLogger("inference_scheduler")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class OverloadedError(Exception):
+    """The request queue is full; the request was shed without running."""
+
+
+class DeadlineExceeded(Exception):
+    """The request waited in the queue past its deadline and was dropped."""
+
+
+class _Job:
+    __slots__ = ("fn", "future", "deadline", "enqueued_at", "timer", "started", "dropped")
+
+    def __init__(self, fn, deadline: Optional[float]):
+        self.fn = fn
+        self.future = Future()
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.timer: Optional[threading.Timer] = None
+        # Set under the scheduler's lock: whichever of a worker, the deadline
+        # timer and a cancelling caller gets to the job first owns it
+        self.started = False
+        self.dropped = False
+
+
+class _LatencyStats:
+    """Running count/mean plus a bounded window of recent samples for percentiles."""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self._recent.append(value)
+
+    def summary(self) -> dict:
+        recent = sorted(self._recent)
+        def pct(p):
+            return recent[min(len(recent) - 1, int(p * len(recent)))] if recent else 0.0
+        return {
+            "count": self.count,
+            "mean_s": self.total / self.count if self.count else 0.0,
+            "p50_s": pct(0.5),
+            "p95_s": pct(0.95),
+            "p99_s": pct(0.99),
+        }
+
+
+class InferenceScheduler:
+    """Fixed pool of model workers fed from a bounded priority queue.
+
+    Each worker thread owns one model built by `model_factory`, so a model is
+    only ever used by one request at a time. Requests carry a priority (lower
+    runs first) and an optional deadline; a request still queued at its
+    deadline fails with DeadlineExceeded as soon as it passes, rather than
+    when a worker frees up, and is skipped instead of running late. A submit
+    against a full queue fails immediately with OverloadedError so the
+    caller can fall back (e.g. escalate) rather than wait behind a hidden
+    backlog. llama.cpp releases the GIL while evaluating, so threads give
+    real parallelism across workers.
+    """
+
+    def __init__(self, name: str, model_factory: Callable[[int], Any], workers: int = 1, max_queue: int = 16):
+        self.name = name
+        self.max_queue = max_queue
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._shed = 0
+        self._expired = 0
+        self._busy = 0
+        # Queued jobs that have neither started nor been dropped (expired or cancelled)
+        self._waiting = 0
+        self._queue_wait = _LatencyStats()
+        self._service_time = _LatencyStats()
+
+        self.models = [model_factory(i) for i in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(model,), name=f"{name}-worker-{i}", daemon=True)
+            for i, model in enumerate(self.models)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"{name} scheduler started with {workers} worker(s), queue limit {max_queue}")
+
+    def submit(self, fn: Callable[[Any], Any], priority: int = PRIORITY_INTERACTIVE,
+               timeout: Optional[float] = None) -> Future:
+        """Queue `fn(model)`; `timeout` is the longest it may wait before starting."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        job = _Job(fn, deadline)
+        with self._stats_lock:
+            if self._waiting >= self.max_queue:
+                self._shed += 1
+                raise OverloadedError(f"{self.name} queue full ({self.max_queue} waiting)")
+            self._submitted += 1
+            self._waiting += 1
+            self._queue.put((priority, next(self._sequence), job))
+        job.future.add_done_callback(lambda _: self._release_cancelled(job))
+        if timeout is not None:
+            job.timer = threading.Timer(timeout, self._expire, args=(job,))
+            job.timer.daemon = True
+            job.timer.start()
+        return job.future
+
+    async def run(self, fn: Callable[[Any], Any], priority: int = PRIORITY_INTERACTIVE,
+                  timeout: Optional[float] = None):
+        return await asyncio.wrap_future(self.submit(fn, priority, timeout))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "workers": len(self.models),
+                "busy_workers": self._busy,
+                "queue_depth": self._waiting,
+                "queue_limit": self.max_queue,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "shed": self._shed,
+                "expired": self._expired,
+                "queue_wait": self._queue_wait.summary(),
+                "service_time": self._service_time.summary(),
+            }
+
+    def _release_cancelled(self, job: _Job):
+        """Done callback: a job its caller cancelled while queued gives up its slot."""
+        if not job.future.cancelled():
+            return
+        with self._stats_lock:
+            if job.started or job.dropped:
+                return
+            job.dropped = True
+            self._waiting -= 1
+        if job.timer is not None:
+            job.timer.cancel()
+
+    def _expire(self, job: _Job):
+        """Deadline timer: fail `job` now if no worker has started it."""
+        with self._stats_lock:
+            if job.started or job.dropped or job.future.cancelled():
+                return
+            job.dropped = True
+            self._waiting -= 1
+            self._expired += 1
+        try:
+            job.future.set_exception(DeadlineExceeded(
+                f"{self.name} request waited {time.monotonic() - job.enqueued_at:.2f}s"
+            ))
+        except InvalidStateError:
+            # Cancelled by the caller in the meantime
+            pass
+
+    def _run(self, model):
+        while True:
+            _, _, job = self._queue.get()
+            started = time.monotonic()
+            with self._stats_lock:
+                if job.dropped:
+                    continue
+                job.started = True
+                self._waiting -= 1
+            if job.timer is not None:
+                job.timer.cancel()
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            if job.deadline is not None and started > job.deadline:
+                # The timer is due but hasn't fired yet
+                with self._stats_lock:
+                    self._expired += 1
+                job.future.set_exception(DeadlineExceeded(
+                    f"{self.name} request waited {started - job.enqueued_at:.2f}s"
+                ))
+                continue
+
+            with self._stats_lock:
+                self._busy += 1
+                self._queue_wait.add(started - job.enqueued_at)
+            try:
+                result = job.fn(model)
+            except Exception as e:
+                with self._stats_lock:
+                    self._failed += 1
+                job.future.set_exception(e)
+            else:
+                with self._stats_lock:
+                    self._completed += 1
+                job.future.set_result(result)
+            finally:
+                with self._stats_lock:
+                    self._busy -= 1
+                    self._service_time.add(time.monotonic() - started)
@@ -0,0 +1,139 @@
+import logging
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("learned_index")
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def normalize(text: str) -> Tuple[str, ...]:
+    """Lowercase word tokens with punctuation dropped."""
+    return tuple(_TOKEN_RE.findall(text.lower()))
+
+
+class LearnedAnswerIndex:
+    """In-process index of the learned answers in storage.
+
+    A learned answer matches when its normalized question appears as a
+    contiguous phrase in the caller's question. Phrases are keyed by their
+    token tuple, and for every first token we record which phrase lengths
+    exist, so a lookup only probes the (position, length) pairs that can
+    match: O(question tokens) dict lookups regardless of index size.
+    When several phrases match, the longest wins, then the newest.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._entries: Dict[str, dict] = {}
+        self._phrases: Dict[Tuple[str, ...], Dict[str, dict]] = {}
+        self._lengths: Dict[str, Dict[int, int]] = {}
+        self._watch = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def start(self, storage):
+        """Load and follow the learned answers in `storage` through a watch."""
+        self._watch = storage.watch_learned_answers(self._apply_changes)
+
+    def stop(self):
+        if self._watch:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        return self._loaded.wait(timeout)
+
+    def entries(self) -> List[dict]:
+        """Snapshot of all indexed learned answers."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def upsert(self, doc_id: str, data: dict):
+        with self._lock:
+            self._remove(doc_id)
+            tokens = normalize(data.get("question", ""))
+            if not tokens:
+                # The previous version of the entry, if any, is gone
+                self.version += 1
+                return
+            learned_at = data.get("learned_at")
+            entry = {
+                "id": doc_id,
+                "question": data.get("question"),
+                "answer": data.get("answer"),
+                "learned_at": learned_at,
+                "rank": learned_at.timestamp() if learned_at else 0.0,
+                "tokens": tokens
+            }
+            self._entries[doc_id] = entry
+            self._phrases.setdefault(tokens, {})[doc_id] = entry
+            lengths = self._lengths.setdefault(tokens[0], {})
+            lengths[len(tokens)] = lengths.get(len(tokens), 0) + 1
+            self.version += 1
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(doc_id)
+            self.version += 1
+
+    def lookup(self, question: str) -> Optional[dict]:
+        tokens = normalize(question)
+        best = None
+        with self._lock:
+            for i, token in enumerate(tokens):
+                for length in self._lengths.get(token, ()):
+                    if i + length > len(tokens):
+                        continue
+                    matches = self._phrases.get(tokens[i:i + length])
+                    if not matches:
+                        continue
+                    candidate = max(matches.values(), key=lambda e: e["rank"])
+                    if best is None or (length, candidate["rank"]) > (len(best["tokens"]), best["rank"]):
+                        best = candidate
+        return best
+
+    def _remove(self, doc_id: str):
+        entry = self._entries.pop(doc_id, None)
+        if entry is None:
+            return
+        tokens = entry["tokens"]
+        matches = self._phrases[tokens]
+        del matches[doc_id]
+        if not matches:
+            del self._phrases[tokens]
+        lengths = self._lengths[tokens[0]]
+        lengths[len(tokens)] -= 1
+        if not lengths[len(tokens)]:
+            del lengths[len(tokens)]
+
+    def _apply_changes(self, changes):
+        for op, doc_id, data in changes:
+            if op == "remove":
+                self.remove(doc_id)
+            else:
+                self.upsert(doc_id, data)
+        if not self._loaded.is_set():
+            logger.info(f"Learned answer index loaded ({len(self._entries)} entries)")
+            self._loaded.set()
+
+
+_index: Optional[LearnedAnswerIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_learned_index(load_timeout: float = 10.0) -> LearnedAnswerIndex:
+    """Return the process-wide index, attaching the storage watch on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            from storage import get_storage
+            _index = LearnedAnswerIndex()
+            _index.start(get_storage())
+            if not _index.wait_until_loaded(load_timeout):
+                logger.warning("Learned answer index not loaded yet; answers will appear as they sync")
+    return _index
@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, List, Optional
+
+logger = logging.getLogger("live_updates")
+
+
+class ChangeCoalescer:
+    """Batches pending-request changes into numbered diff messages.
+
+    Changes arriving within one `window` are merged per request id (the last
+    change wins, so add-then-remove collapses to a single remove) and sent as
+    one message {"epoch", "seq", "changes": [{"op", "id", "request"}]}.
+    The last `history` messages are kept so a reconnecting client can ask
+    for everything after the seq it last applied. `epoch` changes on every
+    restart, telling clients their seq numbers are from an old process.
+    """
+
+    def __init__(self, emit: Callable[[dict], None], window: float = 0.25, history: int = 500):
+        self.emit = emit
+        self.window = window
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self._pending = {}
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def add(self, op: str, request_id: str, request: Optional[dict] = None):
+        with self._lock:
+            self._pending[request_id] = {"op": op, "id": request_id, "request": request}
+
+    def flush(self) -> Optional[dict]:
+        with self._lock:
+            if not self._pending:
+                return None
+            self.seq += 1
+            message = {"epoch": self.epoch, "seq": self.seq, "changes": list(self._pending.values())}
+            self._pending = {}
+            self._history.append(message)
+        self.emit(message)
+        return message
+
+    def since(self, epoch: str, seq: int) -> Optional[List[dict]]:
+        """Messages after `seq`, or None if the client must reload instead."""
+        with self._lock:
+            if epoch != self.epoch:
+                return None
+            if seq >= self.seq:
+                return []
+            if not self._history or self._history[0]["seq"] > seq + 1:
+                return None
+            return [message for message in self._history if message["seq"] > seq]
+
+    def run(self, sleep: Callable[[float], None] = time.sleep):
+        while True:
+            sleep(self.window)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to emit request diff: {e}")
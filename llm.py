@@ -1,64 +1,520 @@
 # llm.py (updated)
-from llama_cpp import Llama
-from db import get_learned_answers
+from answer_cache import AnswerCache
+from learned_index import get_learned_index, normalize
+from retrieval import Retriever
+from prefix_cache import PrefixStateCache, SessionStateCache
+from inference_scheduler import (
+    InferenceScheduler, OverloadedError, DeadlineExceeded, PRIORITY_INTERACTIVE
+)
+from tracing import record, span
 import logging
-from typing import Optional
+import os
+import re
+import threading
+import time
+import uuid
+from typing import AsyncIterator, List, Optional, Tuple
 import asyncio
 
 logger = logging.getLogger("llm_query")
 
-try:
-    llm = Llama(
-        model_path="models/mistral-7b-instruct-v0.2.Q4_K_M.gguf",
-        n_ctx=4096,
-        n_threads=6, 
-        n_gpu_layers=20, 
-        verbose=False
-    )
-    logger.info("LLM initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize LLM: {e}")
-    raise
-
-SYSTEM_PROMPT = """You are a friendly assistant for Bella's Salon. Answer questions politely and concisely.
-If you don't know the answer, say you'll check with a supervisor. Here's salon info:
-- Hours: Mon-Fri 9AM-6PM, Sat 10AM-4PM
-- Services: Haircuts ($30-$50), Coloring ($60-$100), Styling ($40-$80)
-- Booking: Call 555-123-4567 or visit bellassalon.com
-- Location: 123 Main Street, Anytown
-- Team: Lisa (stylist), Maria (color specialist), John (barber)"""
-
-async def query_llm(question: str) -> str:
-    """Query the LLM with proper error handling and async support."""
-    try:
-        learned_answers = get_learned_answers()
-        for answer in learned_answers:
-            if answer["question"].lower() in question.lower():
-                logger.info(f"Using learned answer for: {question}")
-                return answer["answer"]
-        
-        prompt = f"""<s>[INST] <<SYS>>
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "1"))
+LLM_THREADS = int(os.getenv("LLM_THREADS", "6"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "8"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+LLM_MODEL_PATH = os.getenv("LLM_MODEL_PATH", "models/mistral-7b-instruct-v0.2.Q4_K_M.gguf")
+LLM_HISTORY_TOKENS = int(os.getenv("LLM_HISTORY_TOKENS", "1536"))
+LLM_SESSION_CACHE_MB = int(os.getenv("LLM_SESSION_CACHE_MB", "512"))
+LLM_SESSION_MIN_FREE_MB = float(os.getenv("LLM_SESSION_MIN_FREE_MB", "512"))
+OVERLOAD_REPLY = "We're very busy right now. Let me check with my supervisor and get back to you."
+FAILURE_REPLY = "I'm having trouble answering that. Let me check with my supervisor."
+
+# Salon facts live in knowledge_base.json; only the snippets relevant to the
+# question are added to the prompt (see build_prompt)
+SYSTEM_PROMPT = """You are a friendly assistant for Bella's Salon. Answer questions politely and concisely,
+using only the salon info provided with the question.
+If you don't know the answer, say you'll check with a supervisor."""
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.05"))
+LEARNED_MATCH_THRESHOLD = float(os.getenv("LEARNED_MATCH_THRESHOLD", "0.6"))
+
+def system_prefix() -> str:
+    """The fixed head of every prompt, whose KV state is cached."""
+    return f"""<s>[INST] <<SYS>>
 {SYSTEM_PROMPT}
 <</SYS>>
 
+"""
+
+def _salon_info(hits) -> str:
+    lines = []
+    for score, doc in hits:
+        if score < RETRIEVAL_MIN_SCORE:
+            continue
+        if doc["kind"] == "kb":
+            lines.append(f"- {doc['text']}")
+        else:
+            lines.append(f"- Q: {doc['question']} A: {doc['answer']}")
+    return "\n".join(lines) if lines else "- (no matching salon info)"
+
+def _turn_block(question: str, info: Optional[str], first: bool = True) -> str:
+    """One user turn; the first continues the [INST] opened by system_prefix()."""
+    head = "" if first else "[INST] "
+    if info is None:
+        return f"{head}Question: {question}\n[/INST]"
+    return f"""{head}Salon info:
+{info}
+
 Question: {question}
 [/INST]"""
-        
-        loop = asyncio.get_event_loop()
-        output = await loop.run_in_executor(
-            None,
-            lambda: llm(
-                prompt,
-                max_tokens=256,
-                temperature=0.7,
-                top_p=0.9,
-                stop=["</s>", "[INST]"]
+
+def build_prompt(question: str, hits) -> str:
+    """Prompt with the retrieved snippets placed after the fixed system block."""
+    return system_prefix() + _turn_block(question, _salon_info(hits))
+
+# Rough size of a history turn in tokens, without a model to tokenize with
+_CHARS_PER_TOKEN = 4
+
+class ChatSession:
+    """One call's conversation, replayed ahead of each new question.
+
+    Past exchanges are rendered exactly as they were prompted, so a
+    session's prompt only grows at the end and the KV state kept for it
+    (see SessionStateCache) covers everything but the new turn. When the
+    history passes `max_tokens`, the oldest exchanges are dropped down to
+    half the budget, so the full re-prefill that trimming causes happens
+    once every few turns instead of on every turn.
+    """
+
+    def __init__(self, caller_id: str, max_tokens: int = LLM_HISTORY_TOKENS):
+        self.session_id = f"{caller_id}-{uuid.uuid4().hex[:8]}"
+        self.max_tokens = max_tokens
+        # (question, salon info or None, answer)
+        self.turns: List[Tuple[str, Optional[str], str]] = []
+        session_states.open(self.session_id)
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        """Identifies the session's context as of the current turn."""
+        return self.session_id, len(self.turns)
+
+    def last_question(self) -> str:
+        return self.turns[-1][0] if self.turns else ""
+
+    def prompt(self, question: str, info: str) -> str:
+        parts = [system_prefix()]
+        for i, (past_question, past_info, answer) in enumerate(self.turns):
+            parts.append(f"{_turn_block(past_question, past_info, first=i == 0)} {answer}</s>")
+        parts.append(_turn_block(question, info, first=not self.turns))
+        return "".join(parts)
+
+    def add_turn(self, question: str, answer: str, info: Optional[str] = None):
+        self.turns.append((question, info, answer.strip()))
+        if self._history_tokens() > self.max_tokens:
+            dropped = 0
+            while self.turns and self._history_tokens() > self.max_tokens // 2:
+                self.turns.pop(0)
+                dropped += 1
+            logger.info(f"Trimmed {dropped} old turn(s) from session {self.session_id}")
+
+    def close(self):
+        """Forget the conversation and drop its saved KV state."""
+        self.turns = []
+        session_states.close(self.session_id)
+
+    def _history_tokens(self) -> int:
+        chars = sum(len(_turn_block(q, info)) + len(answer) for q, info, answer in self.turns)
+        return chars // _CHARS_PER_TOKEN
+
+class _ModelWorker:
+    """One Llama context plus its prefix snapshot, owned by a scheduler thread."""
+
+    def __init__(self, index: int):
+        from llama_cpp import Llama
+        try:
+            # Weights are mmapped read-only, so every job process on the host
+            # shares one copy through the page cache; only the KV cache is private
+            self.llm = Llama(
+                model_path=LLM_MODEL_PATH,
+                n_ctx=4096,
+                n_threads=max(1, LLM_THREADS // LLM_WORKERS),
+                n_gpu_layers=20,
+                use_mmap=True,
+                use_mlock=os.getenv("LLM_MLOCK", "0") == "1",
+                verbose=False
             )
+            logger.info(f"LLM worker {index} initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize LLM: {e}")
+            raise
+        self.prefix_cache = PrefixStateCache(self.llm)
+        self.prefix_cache.restore(system_prefix())
+        # ChatSession.key of the conversation in the context, if any
+        self.live_session: Optional[Tuple[str, int]] = None
+
+_scheduler: Optional[InferenceScheduler] = None
+_retriever: Optional[Retriever] = None
+_init_lock = threading.Lock()
+
+def get_scheduler() -> InferenceScheduler:
+    """The process-wide scheduler; the first call loads the model(s).
+
+    Every model call goes through the scheduler, which gives each worker's
+    stateful Llama context to one request at a time.
+    """
+    global _scheduler
+    with _init_lock:
+        if _scheduler is None:
+            _scheduler = InferenceScheduler("llm", _ModelWorker, workers=LLM_WORKERS, max_queue=LLM_MAX_QUEUE)
+        return _scheduler
+
+def get_retriever() -> Retriever:
+    """Retriever over the knowledge base and the learned-answer index.
+
+    The index is kept current by a storage watch, so lookups never leave
+    the process.
+    """
+    global _retriever
+    with _init_lock:
+        if _retriever is None:
+            _retriever = Retriever(get_learned_index())
+        return _retriever
+
+# Answers keyed by normalized question, shared by every session in the process
+answer_cache = AnswerCache(max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL,
+                           uncacheable=(OVERLOAD_REPLY, FAILURE_REPLY))
+
+# KV state of conversations swapped out of a worker's context
+session_states = SessionStateCache(LLM_SESSION_CACHE_MB * 1024 * 1024, LLM_SESSION_MIN_FREE_MB)
+
+def _cache_version():
+    """Anything an answer depends on besides the question itself."""
+    # The matrix actually searched, not the latest data: answers generated
+    # while a rebuild runs must not outlive it in the cache
+    return (system_prefix(), repr(GENERATION_KWARGS), get_retriever().built_for())
+
+def prewarm():
+    """Load the retrieval index and the model(s) ahead of the first call."""
+    get_retriever()
+    get_scheduler()
+
+GENERATION_KWARGS = dict(
+    max_tokens=256,
+    temperature=0.7,
+    top_p=0.9,
+    stop=["</s>", "[INST]"]
+)
+
+def _prepare_context(worker: _ModelWorker, session_key: Optional[Tuple[str, int]]):
+    """Load the KV state the prompt for `session_key` (None: stateless) extends.
+
+    Llama's completion call then skips the tokens it shares with the
+    context. The conversation being replaced is saved first if its call is
+    still going and its context moved on since it was last saved. That save
+    copies the session's KV cells: its cost grows with the conversation,
+    which LLM_HISTORY_TOKENS bounds (roughly 128 KB per token for a 7B
+    model with grouped-query attention, so up to ~250 MB), and is paid at
+    most once per turn per session. LLM_SESSION_CACHE_MB=0 skips saving, so
+    a call's follow-ups re-evaluate their history whenever another
+    conversation took the worker in between.
+    """
+    live = worker.live_session
+    if live is not None and (session_key is None or live[0] != session_key[0]):
+        if session_states.wants(live[0], live[1]):
+            session_states.put(live[0], live[1], worker.llm.save_state())
+        live = None
+    if session_key is not None:
+        turns, state = session_states.get(session_key[0])
+        if state is not None and (live is None or turns > live[1]):
+            worker.llm.load_state(state)
+        elif live is None:
+            worker.prefix_cache.restore(system_prefix())
+    else:
+        worker.prefix_cache.restore(system_prefix())
+    worker.live_session = session_key
+
+def _complete(worker: _ModelWorker, prompt: str, timing: dict, stop: threading.Event,
+              session_key: Optional[Tuple[str, int]] = None) -> str:
+    """Run a completion; streamed internally so `timing` gets the first-token time."""
+    pieces = []
+    _complete_stream(worker, prompt, pieces.append, stop, timing, session_key)
+    return "".join(pieces)
+
+def _complete_stream(worker: _ModelWorker, prompt: str, emit, stop: threading.Event, timing: dict,
+                     session_key: Optional[Tuple[str, int]] = None):
+    """Run a streaming completion, passing each text piece to `emit` until `stop` is set.
+
+    `stop` is also checked by llama.cpp after every sampled token, so setting
+    it from another thread (barge-in, a closed stream) frees the worker
+    without waiting for the next piece to be emitted. Fills `timing` with
+    perf_counter() values for "started", "first_token" and "finished" (see
+    _record_timing). With a `session_key`, the conversation's KV state is
+    reused so only the new turn is evaluated.
+    """
+    from llama_cpp import StoppingCriteriaList
+    
+    timing["started"] = time.perf_counter()
+    if stop.is_set():
+        timing["finished"] = timing["started"]
+        return
+    try:
+        _prepare_context(worker, session_key)
+        stopping = StoppingCriteriaList([lambda tokens, logits: stop.is_set()])
+        for chunk in worker.llm(prompt, stream=True, stopping_criteria=stopping, **GENERATION_KWARGS):
+            if stop.is_set():
+                break
+            timing.setdefault("first_token", time.perf_counter())
+            emit(chunk["choices"][0]["text"])
+    finally:
+        timing["finished"] = time.perf_counter()
+
+def _record_timing(submitted: float, timing: dict):
+    """Split one model call into queue wait, prompt eval (to first token) and generation."""
+    started = timing.get("started")
+    if started is None:
+        return
+    record("llm_queue", started - submitted)
+    first_token = timing.get("first_token")
+    finished = timing.get("finished")
+    if first_token is not None:
+        record("llm_prompt_eval", first_token - started)
+        if finished is not None:
+            record("llm_generate", finished - first_token)
+    elif finished is not None:
+        record("llm_prompt_eval", finished - started)
+
+def _resolve(question: str, context: str = "") -> Tuple[Optional[str], list]:
+    """Return (answer, []) for a learned answer, else (None, retrieval hits) for the LLM.
+
+    `context` (the previous question of a conversation) is added to the
+    retrieval query so follow-ups like "and on Saturday?" find their topic.
+    """
+    retriever = get_retriever()
+    with span("lookup"):
+        learned = retriever.learned_index.lookup(question)
+    if learned:
+        logger.info(f"Using learned answer for: {question}")
+        return learned["answer"], []
+    
+    with span("retrieval"):
+        hits = retriever.search(f"{context} {question}".strip(), k=RETRIEVAL_TOP_K)
+    for score, doc in hits:
+        # With context, a learned hit may be matching the previous question
+        if doc["kind"] == "learned" and score >= LEARNED_MATCH_THRESHOLD and not context:
+            logger.info(f"Using learned answer ({score:.2f}) for paraphrase: {question}")
+            return doc["answer"], []
+    
+    return None, hits
+
+def _prompt(question: str, hits, session: Optional[ChatSession], result: dict):
+    """(prompt, session key) for the LLM; result["info"] gets the salon info used."""
+    info = result["info"] = _salon_info(hits)
+    if session is None:
+        return system_prefix() + _turn_block(question, info), None
+    return session.prompt(question, info), session.key
+
+async def _answer(question: str, priority: int, session: Optional[ChatSession] = None,
+                  result: Optional[dict] = None) -> str:
+    answer, hits = _resolve(question, session.last_question() if session else "")
+    if answer is not None:
+        return answer
+    
+    prompt, session_key = _prompt(question, hits, session, result if result is not None else {})
+    timing = {}
+    stop = threading.Event()
+    submitted = time.perf_counter()
+    try:
+        output = await get_scheduler().run(
+            lambda worker: _complete(worker, prompt, timing, stop, session_key),
+            priority=priority,
+            timeout=LLM_QUEUE_TIMEOUT
         )
-        
-        response = output["choices"][0]["text"].strip()
-        logger.info(f"LLM response for '{question}': {response}")
-        return response
+    except asyncio.CancelledError:
+        # Caller barged in or hung up: a queued job is dropped by the
+        # cancelled future, a running one stops at its next token
+        stop.set()
+        raise
+    finally:
+        _record_timing(submitted, timing)
+    
+    response = output.strip()
+    logger.info(f"LLM response for '{question}': {response}")
+    return response
+
+async def query_llm(question: str, priority: int = PRIORITY_INTERACTIVE,
+                    session: Optional[ChatSession] = None) -> str:
+    """Query the LLM with proper error handling and async support.
+
+    Answers come from the answer cache when possible; identical questions
+    asked while one is being generated share that generation. With a
+    `session`, the question is asked in the context of its earlier turns and
+    the exchange is added to it.
+    """
+    try:
+        result = {}
+        if session is not None and session.turns:
+            # Follow-ups depend on the conversation, so they bypass the shared cache
+            answer = await _answer(question, priority, session, result)
+        else:
+            answer = await answer_cache.get_or_compute(
+                normalize(question),
+                _cache_version(),
+                lambda: _answer(question, priority, session, result)
+            )
+        if session is not None:
+            session.add_turn(question, answer, result.get("info"))
+        return answer
+    except (OverloadedError, DeadlineExceeded) as e:
+        logger.warning(f"LLM overloaded, shedding '{question}': {e}")
+        return OVERLOAD_REPLY
     except Exception as e:
         logger.error(f"LLM query failed for '{question}': {e}")
-        return "I'm having trouble answering that. Let me check with my supervisor."
\ No newline at end of file
+        return FAILURE_REPLY
+
+async def query_llm_stream(question: str, session: Optional[ChatSession] = None) -> AsyncIterator[str]:
+    """Like query_llm, but yields text pieces as llama.cpp generates them.
+
+    A cached answer, or one generated for an identical question already in
+    flight, is yielded whole. Closing the generator early (e.g. `aclose()`
+    after an escalation phrase) stops generation at the next token, and the
+    partial answer is neither cached nor added to the `session`.
+    """
+    result = {}
+    if session is not None and session.turns:
+        pieces = _stream_answer(question, result, session)
+        try:
+            async for piece in pieces:
+                yield piece
+        finally:
+            await pieces.aclose()
+        if "answer" in result:
+            session.add_turn(question, result["answer"], result.get("info"))
+        return
+    
+    try:
+        key, version = normalize(question), _cache_version()
+        cached = answer_cache.get(key, version)
+    except Exception as e:
+        logger.error(f"LLM query failed for '{question}': {e}")
+        yield FAILURE_REPLY
+        return
+    if cached is not None:
+        yield cached
+        if session is not None:
+            session.add_turn(question, cached)
+        return
+    
+    future, leader = answer_cache.start(key)
+    if not leader:
+        try:
+            answer = await asyncio.shield(asyncio.wrap_future(future))
+        except Exception:
+            answer = None
+        if answer is not None:
+            yield answer
+            if session is not None:
+                session.add_turn(question, answer)
+            return
+    
+    start = time.perf_counter()
+    pieces = _stream_answer(question, result, session)
+    try:
+        async for piece in pieces:
+            yield piece
+    finally:
+        await pieces.aclose()
+        if leader:
+            answer_cache.finish(key, future, version, answer=result.get("answer"),
+                                generation_s=time.perf_counter() - start)
+    if session is not None and "answer" in result:
+        session.add_turn(question, result["answer"], result.get("info"))
+
+async def _stream_answer(question: str, result: dict,
+                         session: Optional[ChatSession] = None) -> AsyncIterator[str]:
+    """Stream one answer; sets result["answer"] only if it completed normally."""
+    try:
+        answer, hits = _resolve(question, session.last_question() if session else "")
+    except Exception as e:
+        logger.error(f"LLM query failed for '{question}': {e}")
+        yield FAILURE_REPLY
+        return
+    if answer is not None:
+        result["answer"] = answer
+        yield answer
+        return
+    
+    prompt, session_key = _prompt(question, hits, session, result)
+    loop = asyncio.get_event_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+    timing = {}
+    
+    def emit(text):
+        loop.call_soon_threadsafe(queue.put_nowait, text)
+    
+    submitted = time.perf_counter()
+    try:
+        producer = get_scheduler().submit(
+            lambda worker: _complete_stream(worker, prompt, emit, stop, timing, session_key),
+            timeout=LLM_QUEUE_TIMEOUT
+        )
+    except OverloadedError as e:
+        logger.warning(f"LLM overloaded, shedding '{question}': {e}")
+        yield OVERLOAD_REPLY
+        return
+    # Fires on success, failure or deadline expiry alike
+    producer.add_done_callback(lambda _: emit(done))
+    
+    pieces = []
+    try:
+        while True:
+            piece = await queue.get()
+            if piece is done:
+                break
+            pieces.append(piece)
+            yield piece
+        await asyncio.wrap_future(producer)
+        result["answer"] = "".join(pieces).strip()
+        logger.info(f"LLM streamed response for '{question}': {result['answer']}")
+    except DeadlineExceeded as e:
+        logger.warning(f"LLM overloaded, shedding '{question}': {e}")
+        yield OVERLOAD_REPLY
+    except Exception as e:
+        logger.error(f"LLM stream failed for '{question}': {e}")
+        if not pieces:
+            yield FAILURE_REPLY
+    finally:
+        stop.set()
+        producer.cancel()
+        _record_timing(submitted, timing)
+
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+
+async def stream_sentences(pieces: AsyncIterator[str], min_length: int = 20) -> AsyncIterator[str]:
+    """Regroup streamed text into whole sentences for TTS.
+
+    A boundary is sentence punctuation followed by whitespace (or a newline);
+    fragments shorter than `min_length` are held back and merged with the
+    next sentence so abbreviations and "$30." style numbers don't produce
+    choppy one-word utterances.
+    """
+    buffer = ""
+    async for piece in pieces:
+        buffer += piece
+        while True:
+            for match in _SENTENCE_END.finditer(buffer):
+                if match.end() >= min_length:
+                    break
+            else:
+                match = None
+            if match is None:
+                break
+            sentence, buffer = buffer[:match.end()].strip(), buffer[match.end():]
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
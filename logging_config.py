@@ -0,0 +1,149 @@
+"""Logging setup that keeps file and console I/O off the audio loop.
+
+Callers only enqueue records (QueueHandler); a QueueListener thread formats
+them and does the writes, so a slow disk or terminal can't stall frame
+reads. The queue is bounded and drops records when full rather than block.
+
+Levels: LOG_LEVEL sets the root level and LOG_LEVELS overrides it per
+logger ("segmenter=DEBUG,llm_query=WARNING"). At runtime, `set_levels()`
+applies the same syntax, and on POSIX a SIGHUP re-reads LOG_LEVELS_FILE.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger("logging_config")
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records untouched (formatting happens on the listener) and drop on overflow."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same-process queue, so the record needn't be made picklable; the
+        # message is built from msg % args by the listener thread instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogSampler:
+    """Lets a hot-path message through at most once per `interval` seconds.
+
+        if sampler.ready():
+            logger.debug("Audio frame #%d (%d skipped)", n, sampler.skipped)
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.skipped = 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def ready(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next:
+                self.skipped += 1
+                return False
+            self._next = now + self.interval
+            self.skipped = 0
+            return True
+
+
+def set_levels(spec: str):
+    """Apply "name=LEVEL,name=LEVEL" overrides; a bare LEVEL sets the root logger."""
+    for item in spec.replace(";", ",").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, level = item.rpartition("=")
+        try:
+            logging.getLogger(name.strip() or None).setLevel(level.strip().upper())
+        except ValueError as e:
+            logger.error(f"Ignoring log level '{item}': {e}")
+
+
+def _reload_levels_file(path: str):
+    try:
+        with open(path) as f:
+            set_levels(f.read().replace("\n", ","))
+        logger.info(f"Reloaded log levels from {path}")
+    except OSError as e:
+        logger.error(f"Failed to reload log levels from {path}: {e}")
+
+
+def setup_logging(log_file: Optional[str] = None, queue_size: int = 10000):
+    """Route all logging through a background listener (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=10 * 1024 * 1024, backupCount=3
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_NonBlockingQueueHandler(log_queue))
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    set_levels(os.getenv("LOG_LEVELS", ""))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    levels_file = os.getenv("LOG_LEVELS_FILE")
+    if levels_file and hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, lambda signum, frame: _reload_levels_file(levels_file))
+
+
+def record_logger(name: str, path: str, queue_size: int = 10000) -> logging.Logger:
+    """A logger that appends bare messages (e.g. JSON lines) to `path`.
+
+    Writes happen on its own listener thread, like the main log, and records
+    don't propagate, so they stay out of the console and agent log.
+    """
+    record_log = logging.getLogger(name)
+    if record_log.handlers:
+        return record_log
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=10 * 1024 * 1024, backupCount=3)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    record_log.addHandler(_NonBlockingQueueHandler(log_queue))
+    record_log.setLevel(logging.INFO)
+    record_log.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return record_log
+
+
+def dropped_records() -> int:
+    """Records discarded because the log queue was full."""
+    handlers = [h for h in logging.getLogger().handlers if isinstance(h, _NonBlockingQueueHandler)]
+    return sum(h.dropped for h in handlers)
@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger("prefix_cache")
+
+
+class PrefixStateCache:
+    """Snapshot of a llama.cpp context after evaluating a fixed prompt prefix.
+
+    `restore(prefix)` puts the model's KV cache back into the state it had
+    right after the prefix was evaluated. Llama's completion call reuses the
+    longest matching token prefix already in the context, so the following
+    call only evaluates the tokens after the prefix. The snapshot is keyed by
+    a hash of the prefix text and rebuilt whenever that changes.
+
+    Not thread-safe: callers must hold the lock that guards the model.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+        self._fingerprint = None
+        self._state = None
+        self._n_tokens = 0
+
+    @staticmethod
+    def fingerprint(prefix: str) -> str:
+        return hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+
+    def restore(self, prefix: str):
+        fingerprint = self.fingerprint(prefix)
+        if fingerprint != self._fingerprint:
+            self._build(prefix, fingerprint)
+        else:
+            self.llm.load_state(self._state)
+
+    def invalidate(self):
+        self._fingerprint = None
+        self._state = None
+
+    def _build(self, prefix: str, fingerprint: str):
+        start = time.perf_counter()
+        tokens = self.llm.tokenize(prefix.encode("utf-8"), special=True)
+        self.llm.reset()
+        self.llm.eval(tokens)
+        self._state = self.llm.save_state()
+        self._fingerprint = fingerprint
+        self._n_tokens = len(tokens)
+        logger.info(
+            f"Cached KV state for {self._n_tokens}-token prompt prefix "
+            f"({time.perf_counter() - start:.2f}s)"
+        )
+
+
+def available_memory_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo, or None where that isn't readable."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class SessionStateCache:
+    """KV-cache snapshots of live conversations, shared by all model workers.
+
+    A worker's context holds one session at a time. When a job for another
+    session needs that worker, the outgoing session's state is saved here,
+    so its next turn (on any worker) can load it and evaluate only the new
+    tokens. Each snapshot carries the session's turn count so an older
+    context never replaces a newer one. Snapshots are evicted
+    least-recently-used when they exceed `max_bytes` or available memory
+    drops below `min_free_mb`, and dropped when their session closes.
+
+    Thread-safe.
+    """
+
+    def __init__(self, max_bytes: int, min_free_mb: float = 0.0):
+        self.max_bytes = max_bytes
+        self.min_free_mb = min_free_mb
+        self._states: "OrderedDict[str, Tuple[int, object, int]]" = OrderedDict()
+        self._open = set()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def open(self, session_id: str):
+        with self._lock:
+            self._open.add(session_id)
+
+    def close(self, session_id: str):
+        with self._lock:
+            self._open.discard(session_id)
+            self._drop(session_id)
+
+    def is_open(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._open
+
+    def wants(self, session_id: str, turns: int) -> bool:
+        """Whether a snapshot of `session_id` at `turns` would be kept.
+
+        Saving a context copies its whole KV cache, so workers ask first:
+        not for a closed session, when snapshots are disabled (max_bytes 0),
+        or when the saved one is already as recent.
+        """
+        with self._lock:
+            if not self.max_bytes or session_id not in self._open:
+                return False
+            current = self._states.get(session_id)
+            return current is None or current[0] < turns
+
+    def get(self, session_id: str) -> Tuple[int, object]:
+        """(turns, state) of the saved snapshot, or (-1, None)."""
+        with self._lock:
+            entry = self._states.get(session_id)
+            if entry is None:
+                return -1, None
+            self._states.move_to_end(session_id)
+            return entry[0], entry[1]
+
+    def put(self, session_id: str, turns: int, state):
+        size = getattr(state, "llama_state_size", 0)
+        with self._lock:
+            if session_id not in self._open:
+                return
+            current = self._states.get(session_id)
+            if current is not None and current[0] > turns:
+                return
+            self._drop(session_id)
+            self._states[session_id] = (turns, state, size)
+            self._bytes += size
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._open),
+                "snapshots": len(self._states),
+                "mb": round(self._bytes / 1e6, 1),
+                "evictions": self.evictions,
+            }
+
+    def _drop(self, session_id: str):
+        entry = self._states.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict(self):
+        while self._states and (self._bytes > self.max_bytes or self._low_memory()):
+            session_id, (_, _, size) = self._states.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            logger.info(f"Evicted KV state of session {session_id} ({size / 1e6:.1f} MB)")
+
+    def _low_memory(self) -> bool:
+        if not self.min_free_mb:
+            return False
+        available = available_memory_mb()
+        return available is not None and available < self.min_free_mb
@@ -0,0 +1,198 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from learned_index import LearnedAnswerIndex, normalize
+
+logger = logging.getLogger("retrieval")
+
+KNOWLEDGE_BASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.json")
+# How often (seconds) queries stat knowledge_base.json for edits
+KB_CHECK_INTERVAL = float(os.getenv("RETRIEVAL_KB_CHECK_INTERVAL", "1.0"))
+
+_STOPWORDS = frozenset("""
+a about am an and any are at be by can could do does for from get have hello
+hi how i i'm if in is it me much my of on or our please the there this to us
+was we what when where which who will with would you your
+""".split())
+
+
+def load_knowledge_base(path: str = KNOWLEDGE_BASE_PATH) -> Dict[str, str]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _stem(token: str) -> str:
+    """Crude suffix stripping so "cards"/"card" and "parking"/"park" meet."""
+    for suffix in ("ing", "ies", "ed", "s"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return token
+
+
+def content_words(text: str) -> List[str]:
+    """Stemmed tokens of `text` with stopwords dropped."""
+    return [_stem(t) for t in normalize(text) if t not in _STOPWORDS]
+
+
+def _features(text: str) -> List[str]:
+    """Stemmed content-word unigrams plus bigrams."""
+    tokens = content_words(text)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class Retriever:
+    """TF-IDF retrieval over knowledge-base entries and learned Q/A pairs.
+
+    Documents are vectorized into one L2-normalized sparse matrix (sublinear
+    tf, smoothed idf), so a query is a single matrix-vector product followed
+    by a top-k partition. The matrix is rebuilt when the learned answer
+    index or the knowledge-base file changes: the first build happens in
+    line, later ones on a background thread while queries keep using the
+    previous matrix until the new one is swapped in.
+    """
+
+    def __init__(self, learned_index: LearnedAnswerIndex, kb_path: str = KNOWLEDGE_BASE_PATH):
+        self.learned_index = learned_index
+        self.kb_path = kb_path
+        self._lock = threading.Lock()
+        self._built_for = None
+        self._rebuilding = False
+        self._kb_mtime = None
+        self._kb_checked_at = 0.0
+        # (documents, vocabulary, idf, matrix, kinds), swapped in as one unit
+        self._state = ([], {}, np.zeros(0, dtype=np.float32), csr_matrix((0, 0), dtype=np.float32), np.zeros(0, dtype=object))
+
+    def search(self, question: str, k: int = 3, kind: Optional[str] = None) -> List[Tuple[float, dict]]:
+        """Top-k (cosine score, document) pairs, optionally limited to one kind."""
+        self._refresh_if_stale()
+        documents, vocabulary, idf, matrix, kinds = self._state
+        query = self._vectorize(question, vocabulary, idf)
+        if query is None or not documents:
+            return []
+
+        scores = matrix.dot(query)
+        if kind is not None:
+            scores = np.where(kinds == kind, scores, 0.0)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), documents[i]) for i in top if scores[i] > 0]
+
+    def fingerprint(self):
+        """Changes whenever the learned answers or the knowledge-base file do."""
+        now = time.monotonic()
+        if self._kb_mtime is None or now - self._kb_checked_at >= KB_CHECK_INTERVAL:
+            self._kb_mtime = os.path.getmtime(self.kb_path)
+            self._kb_checked_at = now
+        return (self.learned_index.version, self._kb_mtime)
+
+    def built_for(self):
+        """fingerprint() as of the matrix queries are currently served from.
+
+        It lags fingerprint() while a rebuild runs; anything derived from
+        search results (e.g. cached answers) should be versioned by this.
+        """
+        self._refresh_if_stale()
+        with self._lock:
+            return self._built_for
+
+    def _refresh_if_stale(self):
+        fingerprint = self.fingerprint()
+        if fingerprint == self._built_for:
+            return
+        with self._lock:
+            if self._built_for is None:
+                # Nothing to search yet, so there is no old matrix to fall back on
+                self._state = self._build()
+                self._built_for = fingerprint
+                return
+            if self._rebuilding or fingerprint == self._built_for:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, args=(fingerprint,), name="retrieval-rebuild", daemon=True).start()
+
+    def _rebuild(self, fingerprint):
+        try:
+            state = self._build()
+            with self._lock:
+                self._state = state
+                self._built_for = fingerprint
+        except Exception as e:
+            logger.error(f"Retrieval index rebuild failed: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _build(self):
+        """Vectorize the current documents into a new (documents, ..., kinds) state."""
+        documents = [
+            {"kind": "kb", "topic": topic, "text": text}
+            for topic, text in load_knowledge_base(self.kb_path).items()
+        ]
+        documents += [
+            {"kind": "learned", "id": entry["id"], "question": entry["question"],
+             "answer": entry["answer"], "text": entry["question"]}
+            for entry in self.learned_index.entries()
+        ]
+
+        vocabulary: Dict[str, int] = {}
+        rows, cols, values = [], [], []
+        doc_freq = Counter()
+        counts = []
+        for document in documents:
+            text = document["text"]
+            if document["kind"] == "kb":
+                text = f"{document['topic']} {text}"
+            tf = Counter(_features(text))
+            counts.append(tf)
+            doc_freq.update(tf.keys())
+        for term in doc_freq:
+            vocabulary[term] = len(vocabulary)
+
+        n_docs = len(documents)
+        idf = np.zeros(len(vocabulary), dtype=np.float32)
+        for term, df in doc_freq.items():
+            idf[vocabulary[term]] = math.log((1 + n_docs) / (1 + df)) + 1
+
+        for row, tf in enumerate(counts):
+            for term, count in tf.items():
+                rows.append(row)
+                cols.append(vocabulary[term])
+                values.append((1 + math.log(count)) * idf[vocabulary[term]])
+
+        matrix = csr_matrix((values, (rows, cols)), shape=(n_docs, len(vocabulary)), dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix = csr_matrix(matrix.multiply(1 / norms[:, None]))
+
+        kinds = np.array([document["kind"] for document in documents], dtype=object)
+        logger.info(f"Retrieval index built: {n_docs} documents, {len(vocabulary)} terms")
+        return (documents, vocabulary, idf, matrix, kinds)
+
+    @staticmethod
+    def _vectorize(text: str, vocabulary: Dict[str, int], idf: np.ndarray) -> Optional[np.ndarray]:
+        vector = np.zeros(len(vocabulary), dtype=np.float32)
+        # Terms the corpus has never seen still count towards the query norm
+        # (at the rarest idf), otherwise "park my car" would score 1.0 against
+        # a document that only says "park".
+        unseen_weight = float(idf.max()) if len(idf) else 1.0
+        unseen = 0.0
+        for term, count in Counter(_features(text)).items():
+            index = vocabulary.get(term)
+            if index is not None:
+                vector[index] = (1 + math.log(count)) * idf[index]
+            else:
+                unseen += ((1 + math.log(count)) * unseen_weight) ** 2
+        norm = math.sqrt(float(vector.dot(vector)) + unseen)
+        if not vector.any():
+            return None
+        return vector / norm
@@ -0,0 +1,271 @@
+"""Pre-generation routing: answer from memory, ask the LLM, or escalate.
+
+Every question is routed before any generation, from cheap features:
+
+1. escalation keywords ("refund", "manager", ...) -> escalate
+2. a learned answer (exact phrase or close paraphrase) -> learned
+3. the optional classifier, when configured, decides escalate vs llm
+4. otherwise -> llm, whose reply is still checked for escalation phrases
+
+A low retrieval score alone is a poor signal: the knowledge base is a few
+short entries, so "When do you close?" shares no words with the hours entry.
+Setting ROUTER_MIN_SCORE above 0 opts into escalating questions where
+nothing in the knowledge base or learned answers scores at least that much
+(small talk and questions without content words still go to the LLM).
+
+The classifier (ROUTER_CLASSIFIER_PATH) is a JSON logistic model over the
+same features, so it can be fitted offline without extra dependencies:
+
+    {"bias": -0.5, "weights": {"top_score": -9.0, "keyword": 4.0},
+     "token_weights": {"refund": 2.0}, "threshold": 0.6}
+
+Each decision is appended to ROUTER_LOG_PATH as a JSON line, together with
+how the turn ended, and `python router.py router_decisions.jsonl
+--min-score 0.05 0.1 0.2` re-routes the logged features under other
+thresholds to show what would change.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from learned_index import normalize
+from llm import LEARNED_MATCH_THRESHOLD, RETRIEVAL_TOP_K, get_retriever
+from logging_config import record_logger
+from metrics import REGISTRY
+from retrieval import content_words
+
+logger = logging.getLogger("router")
+
+ROUTER_MIN_SCORE = float(os.getenv("ROUTER_MIN_SCORE", "0"))
+ROUTER_CLASSIFIER_PATH = os.getenv("ROUTER_CLASSIFIER_PATH", "")
+ROUTER_LOG_PATH = os.getenv("ROUTER_LOG_PATH", "router_decisions.jsonl")
+ROUTER_ESCALATE_KEYWORDS = os.getenv(
+    "ROUTER_ESCALATE_KEYWORDS",
+    "refund,complaint,complain,manager,supervisor,real person,speak to someone,"
+    "lawyer,allergic,allergy,injury,burned,insurance"
+)
+SMALLTALK_WORDS = frozenset(content_words(
+    "thank thanks so very much bye goodbye okay ok alright great good fine perfect "
+    "yes yeah no nope sure cool awesome"
+))
+
+ROUTE_LEARNED = "learned"
+ROUTE_LLM = "llm"
+ROUTE_ESCALATE = "escalate"
+
+ROUTE_DECISIONS = REGISTRY.counter(
+    "frontdesk_route_decisions_total", "Questions routed before generation", ["route", "reason"]
+)
+
+
+class RouteDecision:
+    """Where a question goes, why, and the features that decided it."""
+
+    def __init__(self, question: str, route: str, reason: str, features: dict,
+                 answer: Optional[str] = None):
+        self.question = question
+        self.route = route
+        self.reason = reason
+        self.features = features
+        self.answer = answer
+
+    def __repr__(self):
+        return f"RouteDecision({self.route}, {self.reason})"
+
+
+def _keyword_phrases(spec: str) -> List[Tuple[str, ...]]:
+    return [normalize(keyword) for keyword in spec.split(",") if normalize(keyword)]
+
+
+def _find_keyword(tokens: Tuple[str, ...], phrases: Iterable[Tuple[str, ...]]) -> Optional[str]:
+    for phrase in phrases:
+        for i in range(len(tokens) - len(phrase) + 1):
+            if tokens[i:i + len(phrase)] == phrase:
+                return " ".join(phrase)
+    return None
+
+
+class Classifier:
+    """Logistic model giving P(escalate) from router features and question words."""
+
+    def __init__(self, bias: float = 0.0, weights: Optional[Dict[str, float]] = None,
+                 token_weights: Optional[Dict[str, float]] = None, threshold: float = 0.5):
+        self.bias = bias
+        self.weights = weights or {}
+        self.token_weights = token_weights or {}
+        self.threshold = threshold
+
+    @classmethod
+    def load(cls, path: str) -> "Classifier":
+        with open(path, encoding="utf-8") as f:
+            params = json.load(f)
+        return cls(params.get("bias", 0.0), params.get("weights"),
+                   params.get("token_weights"), params.get("threshold", 0.5))
+
+    def predict(self, features: dict, words: Iterable[str]) -> float:
+        z = self.bias
+        z += sum(weight * float(features.get(name, 0.0)) for name, weight in self.weights.items())
+        z += sum(self.token_weights.get(word, 0.0) for word in set(words))
+        return 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, z))))
+
+
+def decide(features: dict, min_score: float = ROUTER_MIN_SCORE,
+           learned_threshold: float = LEARNED_MATCH_THRESHOLD) -> Tuple[str, str]:
+    """(route, reason) for a question's features; shared by the router and offline replay."""
+    if features.get("keyword"):
+        return ROUTE_ESCALATE, "keyword"
+    if features.get("learned_exact") or features.get("learned_score", 0.0) >= learned_threshold:
+        return ROUTE_LEARNED, "learned"
+    p_escalate = features.get("p_escalate")
+    if p_escalate is not None:
+        if p_escalate >= features.get("classifier_threshold", 0.5):
+            return ROUTE_ESCALATE, "classifier"
+        return ROUTE_LLM, "classifier"
+    if features.get("content_words", 0) == 0 or features.get("smalltalk"):
+        return ROUTE_LLM, "smalltalk"
+    if min_score > 0 and features.get("top_score", 0.0) < min_score:
+        return ROUTE_ESCALATE, "out_of_scope"
+    return ROUTE_LLM, "in_scope"
+
+
+class Router:
+    """Routes questions using the shared retriever and learned-answer index."""
+
+    def __init__(self, retriever=None, min_score: float = ROUTER_MIN_SCORE,
+                 keywords: str = ROUTER_ESCALATE_KEYWORDS,
+                 classifier: Optional[Classifier] = None, log_path: str = ROUTER_LOG_PATH):
+        self._retriever = retriever
+        self.min_score = min_score
+        self.keywords = _keyword_phrases(keywords)
+        self.classifier = classifier
+        self._decisions = record_logger("router.decisions", log_path) if log_path else None
+
+    @property
+    def retriever(self):
+        if self._retriever is None:
+            self._retriever = get_retriever()
+        return self._retriever
+
+    def route(self, question: str, context: str = "") -> RouteDecision:
+        """Route `question`; `context` (the caller's previous question) helps score follow-ups."""
+        start = time.perf_counter()
+        words = content_words(question)
+        keyword = _find_keyword(normalize(question), self.keywords)
+        features = {
+            "keyword": keyword is not None,
+            "matched_keyword": keyword,
+            "content_words": len(words),
+            "smalltalk": bool(words) and all(word in SMALLTALK_WORDS for word in words),
+            "learned_exact": False,
+            "learned_score": 0.0,
+            "kb_score": 0.0,
+        }
+        answer = None
+
+        learned = self.retriever.learned_index.lookup(question)
+        if learned:
+            features["learned_exact"] = True
+            answer = learned["answer"]
+        for score, doc in self.retriever.search(question, k=RETRIEVAL_TOP_K):
+            name = "learned_score" if doc["kind"] == "learned" else "kb_score"
+            if score > features[name]:
+                features[name] = score
+                if name == "learned_score" and answer is None and score >= LEARNED_MATCH_THRESHOLD:
+                    answer = doc["answer"]
+        if context:
+            # "And on Saturday?" is in scope if the conversation it continues is
+            for score, doc in self.retriever.search(f"{context} {question}", k=RETRIEVAL_TOP_K, kind="kb"):
+                features["kb_score"] = max(features["kb_score"], score)
+        features["top_score"] = max(features["learned_score"], features["kb_score"])
+
+        if self.classifier is not None:
+            features["p_escalate"] = self.classifier.predict(features, words)
+            features["classifier_threshold"] = self.classifier.threshold
+
+        route, reason = decide(features, self.min_score)
+        features["route_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return RouteDecision(question, route, reason, features, answer if route == ROUTE_LEARNED else None)
+
+    def record(self, decision: RouteDecision, caller_id: str, outcome: str):
+        """Count a decision acted on and log it with how the turn ended, for offline tuning."""
+        ROUTE_DECISIONS.inc(route=decision.route, reason=decision.reason)
+        if self._decisions is None:
+            return
+        self._decisions.info(json.dumps({
+            "ts": time.time(),
+            "caller_id": caller_id,
+            "question": decision.question,
+            "route": decision.route,
+            "reason": decision.reason,
+            "outcome": outcome,
+            "features": decision.features,
+        }))
+
+
+_router: Optional[Router] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> Router:
+    """Process-wide router; loads the classifier named by ROUTER_CLASSIFIER_PATH."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            classifier = None
+            if ROUTER_CLASSIFIER_PATH:
+                try:
+                    classifier = Classifier.load(ROUTER_CLASSIFIER_PATH)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Failed to load router classifier {ROUTER_CLASSIFIER_PATH}: {e}")
+            _router = Router(classifier=classifier)
+        return _router
+
+
+def replay(records: List[dict], min_score: float, learned_threshold: float) -> dict:
+    """Re-route logged decisions under other thresholds and compare with the outcomes."""
+    routes = {ROUTE_LEARNED: 0, ROUTE_LLM: 0, ROUTE_ESCALATE: 0}
+    changed = 0
+    # Sent to the LLM, which then escalated anyway: a wasted generation
+    llm_then_escalated = 0
+    # Answered without escalating before, escalated now: a likely false escalation
+    newly_escalated_answered = 0
+    for record in records:
+        route, _ = decide(record["features"], min_score, learned_threshold)
+        routes[route] += 1
+        changed += route != record["route"]
+        if route == ROUTE_LLM and record["route"] == ROUTE_LLM and record["outcome"] == "escalated":
+            llm_then_escalated += 1
+        if route == ROUTE_ESCALATE and record["route"] != ROUTE_ESCALATE and record["outcome"] == "answered":
+            newly_escalated_answered += 1
+    return {
+        "min_score": min_score,
+        "learned_threshold": learned_threshold,
+        "routes": routes,
+        "changed": changed,
+        "llm_then_escalated": llm_then_escalated,
+        "newly_escalated_answered": newly_escalated_answered,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged routing decisions under other thresholds")
+    parser.add_argument("log", help="router decision log (JSON lines)")
+    parser.add_argument("--min-score", type=float, nargs="+", default=[ROUTER_MIN_SCORE])
+    parser.add_argument("--learned-threshold", type=float, nargs="+", default=[LEARNED_MATCH_THRESHOLD])
+    args = parser.parse_args()
+
+    with open(args.log, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    print(f"{len(records)} decisions")
+    for learned_threshold in args.learned_threshold:
+        for min_score in args.min_score:
+            print(json.dumps(replay(records, min_score, learned_threshold)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("segmenter")
+
+
+class UtteranceSegmenter:
+    """Energy-based endpointer that turns a 16-bit PCM stream into utterances.
+
+    Samples are written into a preallocated int16 ring buffer. Each analysis
+    frame is classified as voiced/unvoiced by comparing its RMS against an
+    adaptive noise floor; an utterance starts on the first voiced frame
+    (including a short pre-roll so onsets aren't clipped) and ends after
+    `hangover_ms` of continuous silence or when `max_utterance_s` is reached.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        energy_threshold: float = 500.0,
+        noise_ratio: float = 3.0,
+        hangover_ms: int = 600,
+        min_speech_ms: int = 200,
+        max_utterance_s: float = 15.0,
+        pre_roll_ms: int = 200,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.energy_threshold = energy_threshold
+        self.noise_ratio = noise_ratio
+        self.hangover_frames = max(1, int(hangover_ms / frame_ms))
+        self.min_speech_frames = max(1, int(min_speech_ms / frame_ms))
+        self.max_utterance_samples = int(sample_rate * max_utterance_s)
+        self.pre_roll_samples = int(sample_rate * pre_roll_ms / 1000)
+
+        capacity = self.max_utterance_samples + self.pre_roll_samples + self.frame_size
+        self._ring = np.zeros(capacity, dtype=np.int16)
+        self._write_pos = 0
+        self._total_written = 0
+
+        # Partial analysis frame carried over between pushes
+        self._pending = np.zeros(self.frame_size, dtype=np.int16)
+        self._pending_len = 0
+
+        self._noise_floor = energy_threshold / noise_ratio
+        self._in_speech = False
+        self._utterance_start = 0
+        self._last_end = 0
+        self._voiced_frames = 0
+        self._silent_frames = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self._in_speech
+
+    @property
+    def voiced_samples(self) -> int:
+        """Voiced audio in the in-progress utterance, in samples (0 when idle)."""
+        if not self._in_speech:
+            return 0
+        return self._voiced_frames * self.frame_size
+
+    @property
+    def utterance_samples(self) -> int:
+        """Length of the in-progress utterance in samples (0 when idle)."""
+        if not self._in_speech:
+            return 0
+        return self._total_written - self._utterance_start
+
+    def current_utterance(self) -> Optional[np.ndarray]:
+        """Copy of the audio captured so far for the in-progress utterance."""
+        if not self._in_speech:
+            return None
+        return self._read(self._utterance_start, self._total_written)
+
+    def reset(self):
+        self._pending_len = 0
+        self._in_speech = False
+        self._voiced_frames = 0
+        self._silent_frames = 0
+
+    def push(self, samples: np.ndarray) -> List[np.ndarray]:
+        """Feed int16 mono samples; returns any utterances completed by them."""
+        utterances = []
+        offset = 0
+        n = len(samples)
+
+        if self._pending_len:
+            take = min(self.frame_size - self._pending_len, n)
+            self._pending[self._pending_len:self._pending_len + take] = samples[:take]
+            self._pending_len += take
+            offset = take
+            if self._pending_len < self.frame_size:
+                return utterances
+            utterance = self._process_frame(self._pending)
+            self._pending_len = 0
+            if utterance is not None:
+                utterances.append(utterance)
+
+        while n - offset >= self.frame_size:
+            utterance = self._process_frame(samples[offset:offset + self.frame_size])
+            offset += self.frame_size
+            if utterance is not None:
+                utterances.append(utterance)
+
+        remaining = n - offset
+        if remaining:
+            self._pending[:remaining] = samples[offset:]
+            self._pending_len = remaining
+
+        return utterances
+
+    def flush(self) -> Optional[np.ndarray]:
+        """Emit the in-progress utterance, if any (e.g. when the call ends)."""
+        if not self._in_speech:
+            return None
+        return self._end_utterance(trim_hangover=False)
+
+    def _process_frame(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        self._write(frame)
+
+        rms = float(np.sqrt(np.mean(np.square(frame, dtype=np.float32))))
+        threshold = max(self.energy_threshold, self._noise_floor * self.noise_ratio)
+        voiced = rms > threshold
+
+        if not self._in_speech:
+            if voiced:
+                self._in_speech = True
+                start = self._total_written - self.frame_size - self.pre_roll_samples
+                self._utterance_start = max(start, self._last_end)
+                self._voiced_frames = 1
+                self._silent_frames = 0
+            else:
+                self._noise_floor = 0.95 * self._noise_floor + 0.05 * rms
+            return None
+
+        if voiced:
+            self._voiced_frames += 1
+            self._silent_frames = 0
+        else:
+            self._silent_frames += 1
+
+        if self._silent_frames >= self.hangover_frames:
+            return self._end_utterance(trim_hangover=True)
+        if self._total_written - self._utterance_start >= self.max_utterance_samples:
+            logger.debug("Max utterance length reached, forcing endpoint")
+            return self._end_utterance(trim_hangover=False)
+        return None
+
+    def _write(self, frame: np.ndarray):
+        capacity = len(self._ring)
+        end = self._write_pos + len(frame)
+        if end <= capacity:
+            self._ring[self._write_pos:end] = frame
+        else:
+            split = capacity - self._write_pos
+            self._ring[self._write_pos:] = frame[:split]
+            self._ring[:end - capacity] = frame[split:]
+        self._write_pos = end % capacity
+        self._total_written += len(frame)
+
+    def _read(self, start: int, end: int) -> np.ndarray:
+        """Copy absolute sample range [start, end) out of the ring."""
+        capacity = len(self._ring)
+        start = max(start, self._total_written - capacity)
+        length = end - start
+        if length <= 0:
+            return np.zeros(0, dtype=np.int16)
+        begin = start % capacity
+        if begin + length <= capacity:
+            return self._ring[begin:begin + length].copy()
+        split = capacity - begin
+        return np.concatenate((self._ring[begin:], self._ring[:length - split]))
+
+    def _end_utterance(self, trim_hangover: bool) -> Optional[np.ndarray]:
+        end = self._total_written
+        if trim_hangover:
+            end -= self._silent_frames * self.frame_size
+        voiced_frames = self._voiced_frames
+        start = self._utterance_start
+        self._last_end = end
+        self._in_speech = False
+        self._voiced_frames = 0
+        self._silent_frames = 0
+
+        if voiced_frames < self.min_speech_frames:
+            logger.debug("Discarding %d-frame blip below min speech length", voiced_frames)
+            return None
+        return self._read(start, end)
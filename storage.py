@@ -0,0 +1,585 @@
+"""Storage backends for help requests, learned answers and notifications.
+
+db.py is the public API; it delegates to the backend chosen by the
+STORAGE_BACKEND env var ("firestore", the default, or "sqlite"). The SQLite
+backend (SQLITE_PATH, default frontdesk.db) runs in WAL mode so the
+dashboard and agent processes can share one file, and needs no network or
+credentials, which makes it usable for single-site installs and load tests.
+
+A help request can have several callers: escalation attaches callers who
+ask the same question to the pending request (`caller_ids`) instead of
+creating another one, and resolution answers the request together with any
+other pending request that has the same `question_key`.
+
+Watches deliver `callback(changes)` with changes as (op, id, data) tuples,
+op being "upsert" or "remove". The first callback carries the current state.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, List, Optional
+
+logger = logging.getLogger("storage")
+
+Changes = List[tuple]
+
+
+class RequestNotPending(Exception):
+    """The help request doesn't exist or was already resolved or expired."""
+
+
+class Storage:
+    def new_id(self) -> str:
+        raise NotImplementedError
+
+    def add_help_request(self, request_id: str, request: dict, notification: Optional[dict] = None):
+        """Write a help request and (optionally) its notification atomically."""
+        raise NotImplementedError
+
+    def get_help_request(self, request_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def attach_caller(self, request_id: str, caller_id: str, now: datetime) -> bool:
+        """Add a caller to a pending request; False if it is no longer pending."""
+        raise NotImplementedError
+
+    def pending_requests(self, now: datetime, limit: int, start_after: Optional[str] = None) -> List[dict]:
+        raise NotImplementedError
+
+    def expire_stale_requests(self, now: datetime, limit: int) -> int:
+        """Expire up to `limit` stale pending requests in one batch; returns how many."""
+        raise NotImplementedError
+
+    def request_history(self, page_size: int, fields: List[str], start_after: Optional[str] = None,
+                        status: Optional[str] = None, caller_id: Optional[str] = None) -> List[dict]:
+        raise NotImplementedError
+
+    def resolve_help_request(self, request_id: str, answer: str, now: datetime) -> List[str]:
+        """Resolve a request and its pending duplicates with one learned answer, in one write.
+
+        Returns the caller ids that were waiting on the answer; raises
+        RequestNotPending if the request is missing or no longer pending.
+        """
+        raise NotImplementedError
+
+    def learned_answers(self, limit: int) -> List[dict]:
+        raise NotImplementedError
+
+    def watch_learned_answers(self, callback: Callable[[Changes], None]):
+        raise NotImplementedError
+
+    def watch_pending_requests(self, callback: Callable[[Changes], None]):
+        raise NotImplementedError
+
+
+class FirestoreStorage(Storage):
+    def __init__(self):
+        from firebase_init import get_db
+        self.db = get_db()
+
+    def new_id(self) -> str:
+        return self.db.collection("help_requests").document().id
+
+    def add_help_request(self, request_id, request, notification=None):
+        batch = self.db.batch()
+        batch.set(self.db.collection("help_requests").document(request_id), request)
+        if notification is not None:
+            batch.set(self.db.collection("notifications").document(request_id), notification)
+        batch.commit()
+
+    def get_help_request(self, request_id):
+        doc = self.db.collection("help_requests").document(request_id).get()
+        return {"id": doc.id, **doc.to_dict()} if doc.exists else None
+
+    def attach_caller(self, request_id, caller_id, now):
+        from firebase_admin import firestore
+
+        request_ref = self.db.collection("help_requests").document(request_id)
+
+        @firestore.transactional
+        def attach(transaction):
+            snapshot = request_ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.get("status") != "pending":
+                return False
+            # ArrayUnion keeps retries of the same attach idempotent
+            transaction.update(request_ref, {
+                "caller_ids": firestore.ArrayUnion([caller_id]),
+                "last_updated": now
+            })
+            return True
+
+        return attach(self.db.transaction())
+
+    def pending_requests(self, now, limit, start_after=None):
+        query = self.db.collection("help_requests") \
+            .where("status", "==", "pending") \
+            .where("expires_at", ">", now) \
+            .order_by("expires_at") \
+            .limit(limit)
+        if start_after:
+            cursor = self.db.collection("help_requests").document(start_after).get()
+            if cursor.exists:
+                query = query.start_after(cursor)
+        return [{"id": doc.id, **doc.to_dict()} for doc in query.stream()]
+
+    def expire_stale_requests(self, now, limit):
+        stale = list(
+            self.db.collection("help_requests")
+                .where("status", "==", "pending")
+                .where("expires_at", "<=", now)
+                .limit(limit)
+                .stream()
+        )
+        if not stale:
+            return 0
+        batch = self.db.batch()
+        for doc in stale:
+            batch.update(doc.reference, {
+                "status": "expired",
+                "last_updated": now
+            })
+        batch.commit()
+        return len(stale)
+
+    def request_history(self, page_size, fields, start_after=None, status=None, caller_id=None):
+        query = self.db.collection("help_requests")
+        if status:
+            query = query.where("status", "==", status)
+        if caller_id:
+            from google.cloud.firestore_v1.base_query import FieldFilter, Or
+            # Attached callers are only in caller_ids; requests from before
+            # deduplication only have caller_id
+            query = query.where(filter=Or([
+                FieldFilter("caller_id", "==", caller_id),
+                FieldFilter("caller_ids", "array_contains", caller_id),
+            ]))
+        query = query.order_by("created_at", direction="DESCENDING") \
+            .select(fields) \
+            .limit(page_size)
+        if start_after:
+            cursor = self.db.collection("help_requests").document(start_after).get(field_paths=["created_at"])
+            if cursor.exists:
+                query = query.start_after(cursor)
+        return [{"id": doc.id, **doc.to_dict()} for doc in query.stream()]
+
+    def resolve_help_request(self, request_id, answer, now):
+        from firebase_admin import firestore
+
+        requests = self.db.collection("help_requests")
+        request_ref = requests.document(request_id)
+        learned_ref = self.db.collection("learned_answers").document()
+
+        @firestore.transactional
+        def resolve(transaction):
+            # Everything is read in the transaction, so a caller attached
+            # before the commit makes it retry and is answered too
+            snapshot = request_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                raise RequestNotPending(f"No help request {request_id}")
+            request = snapshot.to_dict()
+            if request.get("status") != "pending":
+                raise RequestNotPending(f"Help request {request_id} is already {request.get('status')}")
+            duplicates = []
+            if request.get("question_key"):
+                duplicates = [
+                    doc for doc in requests
+                        .where("question_key", "==", request["question_key"])
+                        .where("status", "==", "pending")
+                        .limit(_MAX_DUPLICATES)
+                        .stream(transaction=transaction)
+                    if doc.id != request_id
+                ]
+            resolved = {"answer": answer, "status": "resolved", "resolved_at": now, "last_updated": now}
+            transaction.update(request_ref, resolved)
+            for doc in duplicates:
+                transaction.update(doc.reference, {**resolved, "duplicate_of": request_id})
+            transaction.set(learned_ref, {
+                "question": request["question"],
+                "answer": answer,
+                "learned_at": now,
+                "source_request": request_id
+            })
+            return _callers([request] + [doc.to_dict() for doc in duplicates])
+
+        return resolve(self.db.transaction())
+
+    def learned_answers(self, limit):
+        return [
+            {"id": doc.id, **doc.to_dict()}
+            for doc in self.db.collection("learned_answers")
+                .order_by("learned_at", direction="DESCENDING")
+                .limit(limit)
+                .stream()
+        ]
+
+    @staticmethod
+    def _watch(query, callback):
+        def on_snapshot(col_snapshot, changes, read_time):
+            callback([
+                ("remove" if change.type.name == "REMOVED" else "upsert",
+                 change.document.id,
+                 change.document.to_dict())
+                for change in changes
+            ])
+        return query.on_snapshot(on_snapshot)
+
+    def watch_learned_answers(self, callback):
+        return self._watch(self.db.collection("learned_answers"), callback)
+
+    def watch_pending_requests(self, callback):
+        return self._watch(self.db.collection("help_requests").where("status", "==", "pending"), callback)
+
+
+# Pending duplicates resolved alongside a request, keeping the transaction
+# under Firestore's 500 writes
+_MAX_DUPLICATES = 400
+
+
+def _callers(requests: List[dict]) -> List[str]:
+    """Every caller waiting on `requests`, in order, without repeats."""
+    callers = []
+    for request in requests:
+        for caller_id in request.get("caller_ids") or [request.get("caller_id")]:
+            if caller_id and caller_id not in callers:
+                callers.append(caller_id)
+    return callers
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS help_requests (
+    id TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    caller_id TEXT,
+    status TEXT NOT NULL,
+    answer TEXT,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    resolved_at TEXT,
+    last_updated TEXT NOT NULL,
+    extra TEXT,
+    rev INTEGER NOT NULL DEFAULT 0,
+    question_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_requests_status_expires ON help_requests (status, expires_at, id);
+CREATE INDEX IF NOT EXISTS idx_requests_created ON help_requests (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_status_created ON help_requests (status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_caller_created ON help_requests (caller_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_rev ON help_requests (rev);
+CREATE INDEX IF NOT EXISTS idx_requests_status_key ON help_requests (status, question_key);
+
+-- Writers are serialized, so MAX(rev) + 1 increases in commit order and
+-- watchers can follow changes from any process by polling rev
+CREATE TRIGGER IF NOT EXISTS help_requests_rev_insert AFTER INSERT ON help_requests
+BEGIN
+    UPDATE help_requests SET rev = (SELECT COALESCE(MAX(rev), 0) + 1 FROM help_requests) WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS help_requests_rev_update
+AFTER UPDATE OF question, caller_id, status, answer, expires_at, resolved_at, last_updated, extra ON help_requests
+BEGIN
+    UPDATE help_requests SET rev = (SELECT COALESCE(MAX(rev), 0) + 1 FROM help_requests) WHERE id = NEW.id;
+END;
+
+CREATE TABLE IF NOT EXISTS learned_answers (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    learned_at TEXT NOT NULL,
+    source_request TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_learned_at ON learned_answers (learned_at DESC);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id TEXT PRIMARY KEY,
+    type TEXT,
+    request_id TEXT,
+    caller_id TEXT,
+    question TEXT,
+    timestamp TEXT,
+    status TEXT
+);
+"""
+
+_REQUEST_COLUMNS = ["question", "caller_id", "status", "answer", "created_at",
+                    "expires_at", "resolved_at", "last_updated", "question_key"]
+_DATETIME_COLUMNS = {"created_at", "expires_at", "resolved_at", "last_updated", "learned_at", "timestamp"}
+
+
+def _to_db(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _from_row(row: sqlite3.Row) -> dict:
+    data = {}
+    for key in row.keys():
+        value = row[key]
+        if key == "extra":
+            data.update(json.loads(value) if value else {})
+        elif key in ("seq", "rev"):
+            continue
+        elif key in _DATETIME_COLUMNS and value:
+            data[key] = datetime.fromisoformat(value)
+        else:
+            data[key] = value
+    return data
+
+
+class _PollingWatch:
+    """Calls `poll()` every `interval` seconds on a daemon thread until unsubscribed."""
+
+    def __init__(self, poll: Callable[[], None], interval: float):
+        self._stop = threading.Event()
+        self._poll = poll
+        self._interval = interval
+        self._thread = threading.Thread(target=self._run, name="sqlite-watch", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._poll()
+            except Exception as e:
+                logger.error(f"SQLite watch poll failed: {e}")
+            if self._stop.wait(self._interval):
+                return
+
+    def unsubscribe(self):
+        self._stop.set()
+
+
+class SqliteStorage(Storage):
+    """Local SQLite storage (WAL mode), indexed for the dashboard and agent queries.
+
+    Connections are per thread. Watches poll for changes: learned answers by
+    their insertion sequence, help requests by a revision number that a
+    trigger bumps on every write.
+    """
+
+    def __init__(self, path: str = "frontdesk.db", poll_interval: float = 0.5):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(help_requests)")}
+        if columns and "question_key" not in columns:
+            # Databases created before escalations were deduplicated
+            conn.execute("ALTER TABLE help_requests ADD COLUMN question_key TEXT")
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex[:20]
+
+    def add_help_request(self, request_id, request, notification=None):
+        columns = {key: _to_db(request.get(key)) for key in _REQUEST_COLUMNS}
+        extra = {key: value for key, value in request.items() if key not in _REQUEST_COLUMNS}
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO help_requests (id, {', '.join(columns)}, extra) "
+                f"VALUES (?, {', '.join('?' for _ in columns)}, ?)",
+                [request_id, *columns.values(), json.dumps(extra, default=_to_db) if extra else None]
+            )
+            if notification is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO notifications "
+                    "(id, type, request_id, caller_id, question, timestamp, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [request_id, notification.get("type"), notification.get("request_id"),
+                     notification.get("caller_id"), notification.get("question"),
+                     _to_db(notification.get("timestamp")), notification.get("status")]
+                )
+
+    def get_help_request(self, request_id):
+        row = self._conn().execute("SELECT * FROM help_requests WHERE id = ?", [request_id]).fetchone()
+        return _from_row(row) if row else None
+
+    def attach_caller(self, request_id, caller_id, now):
+        conn = self._conn()
+        with conn:
+            # caller_ids lives in the JSON `extra` column, so read-modify-write
+            # under the write lock
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT caller_id, status, extra FROM help_requests WHERE id = ?", [request_id]
+            ).fetchone()
+            if row is None or row["status"] != "pending":
+                return False
+            extra = json.loads(row["extra"]) if row["extra"] else {}
+            caller_ids = extra.get("caller_ids") or [row["caller_id"]]
+            if caller_id not in caller_ids:
+                extra["caller_ids"] = caller_ids + [caller_id]
+                conn.execute(
+                    "UPDATE help_requests SET extra = ?, last_updated = ? WHERE id = ?",
+                    [json.dumps(extra, default=_to_db), _to_db(now), request_id]
+                )
+        return True
+
+    def pending_requests(self, now, limit, start_after=None):
+        conn = self._conn()
+        params = [_to_db(now)]
+        cursor_clause = ""
+        if start_after:
+            cursor = conn.execute("SELECT expires_at FROM help_requests WHERE id = ?", [start_after]).fetchone()
+            if cursor:
+                cursor_clause = "AND (expires_at, id) > (?, ?)"
+                params += [cursor["expires_at"], start_after]
+        rows = conn.execute(
+            f"SELECT * FROM help_requests WHERE status = 'pending' AND expires_at > ? {cursor_clause} "
+            f"ORDER BY expires_at, id LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def expire_stale_requests(self, now, limit):
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE help_requests SET status = 'expired', last_updated = ? WHERE id IN ("
+                "SELECT id FROM help_requests WHERE status = 'pending' AND expires_at <= ? LIMIT ?)",
+                [_to_db(now), _to_db(now), limit]
+            )
+        return cursor.rowcount
+
+    def request_history(self, page_size, fields, start_after=None, status=None, caller_id=None):
+        conn = self._conn()
+        where, params = [], []
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if caller_id:
+            # Attached callers are only in the caller_ids list in `extra`
+            where.append("(caller_id = ? OR EXISTS ("
+                         "SELECT 1 FROM json_each(extra, '$.caller_ids') WHERE value = ?))")
+            params += [caller_id, caller_id]
+        if start_after:
+            cursor = conn.execute("SELECT created_at FROM help_requests WHERE id = ?", [start_after]).fetchone()
+            if cursor:
+                where.append("(created_at, id) < (?, ?)")
+                params += [cursor["created_at"], start_after]
+        columns = ", ".join(["id"] + [f for f in fields if f in _REQUEST_COLUMNS])
+        rows = conn.execute(
+            f"SELECT {columns} FROM help_requests "
+            f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+            f"ORDER BY created_at DESC, id DESC LIMIT ?",
+            params + [page_size]
+        ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def resolve_help_request(self, request_id, answer, now):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM help_requests WHERE id = ?", [request_id]).fetchone()
+            if row is None:
+                raise RequestNotPending(f"No help request {request_id}")
+            if row["status"] != "pending":
+                raise RequestNotPending(f"Help request {request_id} is already {row['status']}")
+            duplicates = []
+            if row["question_key"]:
+                duplicates = conn.execute(
+                    "SELECT * FROM help_requests WHERE status = 'pending' AND question_key = ? AND id != ?",
+                    [row["question_key"], request_id]
+                ).fetchall()
+            for target in [row] + duplicates:
+                extra = json.loads(target["extra"]) if target["extra"] else {}
+                if target is not row:
+                    extra["duplicate_of"] = request_id
+                conn.execute(
+                    "UPDATE help_requests SET answer = ?, status = 'resolved', resolved_at = ?, last_updated = ?, "
+                    "extra = ? WHERE id = ?",
+                    [answer, _to_db(now), _to_db(now),
+                     json.dumps(extra, default=_to_db) if extra else None, target["id"]]
+                )
+            conn.execute(
+                "INSERT INTO learned_answers (id, question, answer, learned_at, source_request) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [self.new_id(), row["question"], answer, _to_db(now), request_id]
+            )
+        return _callers([_from_row(target) for target in [row] + duplicates])
+
+    def learned_answers(self, limit):
+        rows = self._conn().execute(
+            "SELECT * FROM learned_answers ORDER BY learned_at DESC LIMIT ?", [limit]
+        ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def watch_learned_answers(self, callback):
+        state = {"seq": 0, "first": True}
+
+        def poll():
+            rows = self._conn().execute(
+                "SELECT * FROM learned_answers WHERE seq > ? ORDER BY seq", [state["seq"]]
+            ).fetchall()
+            if rows:
+                state["seq"] = rows[-1]["seq"]
+            if rows or state["first"]:
+                state["first"] = False
+                callback([("upsert", row["id"], _from_row(row)) for row in rows])
+
+        return _PollingWatch(poll, self.poll_interval)
+
+    def watch_pending_requests(self, callback):
+        state = {"rev": None, "pending": set()}
+
+        def poll():
+            conn = self._conn()
+            if state["rev"] is None:
+                # Initial state: every pending request, then follow revisions
+                with conn:
+                    state["rev"] = conn.execute("SELECT COALESCE(MAX(rev), 0) FROM help_requests").fetchone()[0]
+                    rows = conn.execute("SELECT * FROM help_requests WHERE status = 'pending'").fetchall()
+                state["pending"] = {row["id"] for row in rows}
+                callback([("upsert", row["id"], _from_row(row)) for row in rows])
+                return
+
+            rows = conn.execute(
+                "SELECT * FROM help_requests WHERE rev > ? ORDER BY rev", [state["rev"]]
+            ).fetchall()
+            changes = []
+            for row in rows:
+                if row["status"] == "pending":
+                    state["pending"].add(row["id"])
+                    changes.append(("upsert", row["id"], _from_row(row)))
+                elif row["id"] in state["pending"]:
+                    state["pending"].discard(row["id"])
+                    changes.append(("remove", row["id"], _from_row(row)))
+            if rows:
+                state["rev"] = rows[-1]["rev"]
+            if changes:
+                callback(changes)
+
+        return _PollingWatch(poll, self.poll_interval)
+
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """The process-wide backend selected by STORAGE_BACKEND."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            backend = os.getenv("STORAGE_BACKEND", "firestore")
+            if backend == "sqlite":
+                _storage = SqliteStorage(os.getenv("SQLITE_PATH", "frontdesk.db"))
+            elif backend == "firestore":
+                _storage = FirestoreStorage()
+            else:
+                raise ValueError(f"Unknown STORAGE_BACKEND '{backend}' (use 'firestore' or 'sqlite')")
+            logger.info(f"Using {backend} storage")
+        return _storage
@@ -0,0 +1,169 @@
+import logging
+import os
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("stt_backends")
+
+
+class STTBackend:
+    """Speech-to-text engine used by the STT service.
+
+    `transcribe` follows the `whisper.Model.transcribe` result shape:
+    {"text": str, "segments": [{"words": [{"word", "start", "end"}, ...]}]},
+    with "words" present only when `word_timestamps=True` is requested.
+    Backends that can decode several utterances in one forward pass set
+    `supports_batching` and override `transcribe_batch`.
+    """
+
+    name = "base"
+    supports_batching = False
+    max_batch_samples = 30 * 16000
+
+    def transcribe(self, audio: np.ndarray, **options) -> dict:
+        raise NotImplementedError
+
+    def transcribe_batch(self, audios: List[np.ndarray], prompt: Optional[str] = None) -> List[str]:
+        return [
+            self.transcribe(audio, language="en", initial_prompt=prompt)["text"]
+            for audio in audios
+        ]
+
+
+def _load_whisper(model_name: str):
+    """whisper.load_model, with the checkpoint memory-mapped when possible.
+
+    With mmap the fp32 weights stay file-backed pages, shared by every
+    process on the host that loads the same model, instead of a private
+    copy per job process. Falls back to a normal load on older torch or
+    custom checkpoints (STT_MMAP=0 disables it).
+    """
+    import whisper
+    if os.getenv("STT_MMAP", "1") == "1" and model_name in whisper._MODELS:
+        try:
+            import torch
+            from whisper.model import ModelDimensions, Whisper
+            root = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "whisper")
+            path = whisper._download(whisper._MODELS[model_name], root, in_memory=False)
+            checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+            model = Whisper(ModelDimensions(**checkpoint["dims"]))
+            model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+            model.set_alignment_heads(whisper._ALIGNMENT_HEADS[model_name])
+            return model
+        except Exception as e:
+            logger.warning(f"Memory-mapped Whisper load failed ({e}); loading into memory")
+    return whisper.load_model(model_name, device="cpu")
+
+
+class WhisperBackend(STTBackend):
+    """openai-whisper in fp32 on CPU (the original engine)."""
+
+    name = "whisper"
+    supports_batching = True
+
+    def __init__(self, model_name: str = "base"):
+        import whisper
+        self._whisper = whisper
+        self.model = _load_whisper(model_name)
+        self.max_batch_samples = whisper.audio.N_SAMPLES
+
+    def transcribe(self, audio: np.ndarray, **options) -> dict:
+        options.setdefault("fp16", False)
+        return self.model.transcribe(audio, **options)
+
+    def transcribe_batch(self, audios: List[np.ndarray], prompt: Optional[str] = None) -> List[str]:
+        import torch
+        whisper = self._whisper
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels)
+            for audio in audios
+        ]).to(self.model.device)
+        options = whisper.DecodingOptions(
+            language="en",
+            fp16=False,
+            without_timestamps=True,
+            prompt=prompt
+        )
+        return [result.text for result in whisper.decode(self.model, mels, options)]
+
+
+class WhisperInt8Backend(WhisperBackend):
+    """openai-whisper with Linear layers dynamically quantized to int8.
+
+    Needs no extra dependency and keeps batched decoding; accuracy and speed
+    relative to fp32 should be checked with bench_stt.py on the target CPU.
+    """
+
+    name = "whisper-int8"
+
+    def __init__(self, model_name: str = "base"):
+        super().__init__(model_name)
+        import torch
+        self.model = torch.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+
+class FasterWhisperBackend(STTBackend):
+    """CTranslate2 Whisper (faster-whisper) with int8 weights on CPU."""
+
+    name = "faster-whisper"
+
+    def __init__(self, model_name: str = "base", compute_type: str = "int8"):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError(
+                f"STT backend '{self.name}' needs the faster-whisper package "
+                f"(pip install -r requirements-faster-whisper.txt): {e}"
+            ) from e
+        self.model = WhisperModel(
+            model_name,
+            device="cpu",
+            compute_type=compute_type,
+            cpu_threads=int(os.getenv("STT_CPU_THREADS", "0"))
+        )
+
+    def transcribe(self, audio: np.ndarray, **options) -> dict:
+        word_timestamps = options.get("word_timestamps", False)
+        segments, _ = self.model.transcribe(
+            audio,
+            language=options.get("language", "en"),
+            initial_prompt=options.get("initial_prompt"),
+            condition_on_previous_text=options.get("condition_on_previous_text", True),
+            word_timestamps=word_timestamps,
+            beam_size=options.get("beam_size", 1)
+        )
+        result_segments = []
+        for segment in segments:
+            entry = {"text": segment.text, "start": segment.start, "end": segment.end}
+            if word_timestamps:
+                entry["words"] = [
+                    {"word": word.word, "start": word.start, "end": word.end}
+                    for word in segment.words or []
+                ]
+            result_segments.append(entry)
+        return {
+            "text": "".join(segment["text"] for segment in result_segments),
+            "segments": result_segments
+        }
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    WhisperInt8Backend.name: WhisperInt8Backend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def load_backend(name: Optional[str] = None, model_name: Optional[str] = None) -> STTBackend:
+    """Instantiate the backend named by `name` or the STT_BACKEND env var."""
+    name = name or os.getenv("STT_BACKEND", WhisperBackend.name)
+    model_name = model_name or os.getenv("STT_MODEL", "base")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend '{name}' (choose from {', '.join(BACKENDS)})")
+    logger.info(f"Loading STT backend '{name}' with model '{model_name}'...")
+    backend = BACKENDS[name](model_name)
+    logger.info(f"STT backend '{name}' loaded")
+    return backend
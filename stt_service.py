@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+
+from stt_backends import STTBackend, load_backend
+
+logger = logging.getLogger("stt_service")
+
+
+class _Request:
+    __slots__ = ("audio", "options", "future", "submitted_at")
+
+    def __init__(self, audio: np.ndarray, options: dict):
+        self.audio = audio
+        self.options = options
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+
+    def batchable(self, backend: STTBackend) -> bool:
+        return (
+            backend.supports_batching
+            and not self.options.get("word_timestamps")
+            and len(self.audio) <= backend.max_batch_samples
+        )
+
+
+class STTService:
+    """Process-wide STT inference shared by every call session.
+
+    Sessions submit audio from any thread; a single worker thread owns the
+    backend, drains whatever is pending (waiting up to `max_wait_ms` for more
+    to arrive) and, if the backend supports it, decodes single-window
+    utterances that share a prompt in one batched forward pass. Requests that
+    need word timestamps or span more than one window fall back to
+    `backend.transcribe` on the same worker.
+
+    `transcribe` mirrors `whisper.Model.transcribe` so the service can be used
+    anywhere a model was.
+    """
+
+    def __init__(self, backend: STTBackend, max_batch_size: int = 8, max_wait_ms: int = 30):
+        self.backend = backend
+
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._batched_items = 0
+        self._max_batch_seen = 0
+        self._last_batch_size = 0
+        self._wait_time_total = 0.0
+
+        self._worker = threading.Thread(target=self._run, name="stt-service", daemon=True)
+        self._worker.start()
+
+    def submit(self, audio: np.ndarray, **options) -> Future:
+        request = _Request(np.asarray(audio, dtype=np.float32), options)
+        self._queue.put(request)
+        return request.future
+
+    def transcribe(self, audio: np.ndarray, **options) -> dict:
+        """Blocking transcribe; safe to call from executor threads."""
+        return self.submit(audio, **options).result()
+
+    async def transcribe_async(self, audio: np.ndarray, **options) -> dict:
+        return await asyncio.wrap_future(self.submit(audio, **options))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": self._batches,
+                "avg_batch_size": self._batched_items / self._batches if self._batches else 0.0,
+                "max_batch_size": self._max_batch_seen,
+                "last_batch_size": self._last_batch_size,
+                "avg_queue_wait_s": self._wait_time_total / self._requests if self._requests else 0.0,
+            }
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            now = time.monotonic()
+            with self._stats_lock:
+                self._requests += len(pending)
+                self._wait_time_total += sum(now - r.submitted_at for r in pending)
+
+            groups = {}
+            for request in pending:
+                if request.batchable(self.backend):
+                    groups.setdefault(request.options.get("initial_prompt"), []).append(request)
+                else:
+                    self._run_single(request)
+
+            for prompt, requests in groups.items():
+                if len(requests) == 1:
+                    self._run_single(requests[0])
+                else:
+                    self._run_batch(requests, prompt)
+
+    def _record_batch(self, size: int):
+        with self._stats_lock:
+            self._batches += 1
+            self._batched_items += size
+            self._last_batch_size = size
+            self._max_batch_seen = max(self._max_batch_seen, size)
+
+    def _run_single(self, request: _Request):
+        self._record_batch(1)
+        try:
+            result = self.backend.transcribe(request.audio, **request.options)
+            request.future.set_result(result)
+        except Exception as e:
+            logger.error(f"Transcription failed: {e}")
+            request.future.set_exception(e)
+
+    def _run_batch(self, requests, prompt: Optional[str]):
+        self._record_batch(len(requests))
+        try:
+            texts = self.backend.transcribe_batch([request.audio for request in requests], prompt)
+            for request, text in zip(requests, texts):
+                request.future.set_result({"text": text, "segments": []})
+        except Exception as e:
+            logger.error(f"Batched transcription of {len(requests)} utterances failed: {e}")
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+
+_service: Optional[STTService] = None
+_service_lock = threading.Lock()
+
+
+def get_stt_service() -> STTService:
+    """Return the process-wide STT service, loading the backend on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = STTService(
+                load_backend(),
+                max_batch_size=int(os.getenv("STT_MAX_BATCH", "8")),
+                max_wait_ms=int(os.getenv("STT_BATCH_WAIT_MS", "30"))
+            )
+        return _service
@@ -0,0 +1,98 @@
+import asyncio
+
+from answer_cache import AnswerCache
+
+FALLBACK = "Let me check with my supervisor."
+
+
+def _counting(answer, delay=0.05):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return answer
+    return compute, calls
+
+
+def test_concurrent_identical_questions_share_one_generation():
+    cache = AnswerCache()
+    compute, calls = _counting("We open at 9.")
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("hours", 1, compute) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["We open at 9."] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+    assert cache.get("hours", 1) == "We open at 9."
+
+
+def test_follower_generates_itself_when_the_leader_is_cancelled():
+    cache = AnswerCache()
+    compute, calls = _counting("We open at 9.")
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_compute("hours", 1, compute))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(cache.get_or_compute("hours", 1, compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == "We open at 9."
+    assert len(calls) == 2
+
+
+def test_errors_reach_followers_and_are_not_cached():
+    cache = AnswerCache()
+
+    async def fail():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("model crashed")
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("hours", 1, fail) for _ in range(3)),
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+    assert cache.get("hours", 1) is None
+
+
+def test_blank_and_fallback_answers_are_not_cached():
+    cache = AnswerCache(uncacheable=[FALLBACK])
+    for answer in ("", "  ", FALLBACK):
+        compute, calls = _counting(answer, delay=0)
+        assert asyncio.run(cache.get_or_compute("hours", 1, compute)) == answer
+        assert cache.get("hours", 1) is None
+
+
+def test_followers_do_not_share_a_fallback_answer():
+    cache = AnswerCache(uncacheable=[FALLBACK])
+    answers = iter([FALLBACK, "We open at 9."])
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return next(answers)
+
+    async def main():
+        return await asyncio.gather(cache.get_or_compute("hours", 1, compute),
+                                    cache.get_or_compute("hours", 1, compute))
+
+    assert asyncio.run(main()) == [FALLBACK, "We open at 9."]
+
+
+def test_new_version_invalidates_and_ttl_expires():
+    cache = AnswerCache(ttl=60)
+    future, _ = cache.start("hours")
+    cache.get("hours", 1)
+    cache.finish("hours", future, 1, answer="We open at 9.")
+    assert cache.get("hours", 1) == "We open at 9."
+    assert cache.get("hours", 2) is None
+    assert cache.get("hours", 1) is None
+
+    expired = AnswerCache(ttl=0)
+    future, _ = expired.start("hours")
+    expired.get("hours", 1)
+    expired.finish("hours", future, 1, answer="We open at 9.")
+    assert expired.get("hours", 1) is None
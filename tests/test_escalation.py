@@ -0,0 +1,66 @@
+import pytest
+
+import escalation
+import storage as storage_module
+from escalation import PendingRequestIndex, escalate_question
+from storage import SqliteStorage
+
+
+def test_same_question_matches_by_key():
+    index = PendingRequestIndex(similarity=0.8)
+    index.add("r1", "Do you sell gift cards?")
+    assert index.match("do you sell GIFT cards") == "r1"
+    assert index.match("Is there parking?") is None
+
+
+def test_paraphrase_matches_by_word_overlap():
+    index = PendingRequestIndex(similarity=0.5)
+    index.add("r1", "Can I bring my dog to the salon?")
+    index.add("r2", "Is there parking behind the building?")
+    assert index.match("Can I bring my dog along to the salon") == "r1"
+    strict = PendingRequestIndex(similarity=0.9)
+    strict.add("r1", "Can I bring my dog to the salon?")
+    assert strict.match("Can I bring my dog along to the salon") is None
+
+
+def test_remove_hands_the_key_to_another_pending_request():
+    index = PendingRequestIndex()
+    index.add("r1", "Do you sell gift cards?")
+    index.add("r2", "Do you sell gift cards?")
+    index.remove("r1")
+    assert index.match("Do you sell gift cards?") == "r2"
+    index._apply_changes([("remove", "r2", {}), ("upsert", "r3", {"question": "Is there parking?"})])
+    assert len(index) == 1
+    assert index.match("Do you sell gift cards?") is None
+    assert index.match("is there parking") == "r3"
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path, monkeypatch):
+    storage = SqliteStorage(str(tmp_path / "frontdesk.db"), poll_interval=0.01)
+    monkeypatch.setattr(storage_module, "_storage", storage)
+    monkeypatch.setattr(escalation, "ESCALATION_DEDUP", True)
+    monkeypatch.setattr(escalation, "_pending_index", PendingRequestIndex())
+    return storage
+
+
+def test_repeat_escalations_attach_to_the_pending_request(sqlite_storage):
+    first = escalate_question("Do you sell gift cards?", "caller-a")
+    assert escalate_question("do you sell gift cards", "caller-b") == first
+    assert escalate_question("Do you sell gift cards?", "caller-a") == first
+    other = escalate_question("Is there parking?", "caller-c")
+    assert other != first
+
+    assert sqlite_storage.get_help_request(first)["caller_ids"] == ["caller-a", "caller-b"]
+    assert sqlite_storage.resolve_help_request(first, "Yes.", sqlite_storage.get_help_request(first)["created_at"]) \
+        == ["caller-a", "caller-b"]
+
+
+def test_escalation_after_resolution_creates_a_new_request(sqlite_storage):
+    first = escalate_question("Do you sell gift cards?", "caller-a")
+    sqlite_storage.resolve_help_request(first, "Yes.", sqlite_storage.get_help_request(first)["created_at"])
+    # The index hasn't heard about the resolution yet; the attach fails and a request is created
+    second = escalate_question("Do you sell gift cards?", "caller-b")
+    assert second != first
+    assert sqlite_storage.get_help_request(second)["status"] == "pending"
+    assert escalation.get_pending_index().match("Do you sell gift cards?") == second
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from inference_scheduler import (PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, DeadlineExceeded,
+                                 InferenceScheduler, OverloadedError)
+
+
+@pytest.fixture
+def blocked_scheduler():
+    """One worker, held busy until the returned event is set."""
+    scheduler = InferenceScheduler("test", lambda i: i, workers=1, max_queue=2)
+    release = threading.Event()
+    blocker = scheduler.submit(lambda model: release.wait(5))
+    while scheduler.stats()["busy_workers"] == 0:
+        time.sleep(0.001)
+    yield scheduler, release
+    release.set()
+    blocker.result(5)
+
+
+def test_runs_higher_priority_first(blocked_scheduler):
+    scheduler, release = blocked_scheduler
+    order = []
+    background = scheduler.submit(lambda model: order.append("background"), priority=PRIORITY_BACKGROUND)
+    interactive = scheduler.submit(lambda model: order.append("interactive"), priority=PRIORITY_INTERACTIVE)
+    release.set()
+    background.result(5)
+    interactive.result(5)
+    assert order == ["interactive", "background"]
+
+
+def test_sheds_when_queue_full(blocked_scheduler):
+    scheduler, _ = blocked_scheduler
+    scheduler.submit(lambda model: None)
+    scheduler.submit(lambda model: None)
+    with pytest.raises(OverloadedError):
+        scheduler.submit(lambda model: None)
+    assert scheduler.stats()["shed"] == 1
+
+
+def test_queued_job_expires_at_its_deadline(blocked_scheduler):
+    scheduler, release = blocked_scheduler
+    ran = []
+    future = scheduler.submit(lambda model: ran.append(model), timeout=0.05)
+    # Fails while the worker is still busy, not when it frees up
+    with pytest.raises(DeadlineExceeded):
+        future.result(1)
+    assert scheduler.stats()["queue_depth"] == 0
+    release.set()
+    scheduler.submit(lambda model: None).result(5)
+    assert ran == []
+    assert scheduler.stats()["expired"] == 1
+
+
+def test_expired_job_frees_its_queue_slot(blocked_scheduler):
+    scheduler, _ = blocked_scheduler
+    expiring = scheduler.submit(lambda model: None, timeout=0.01)
+    scheduler.submit(lambda model: None)
+    with pytest.raises(DeadlineExceeded):
+        expiring.result(1)
+    scheduler.submit(lambda model: None)
+
+
+def test_cancelled_jobs_free_their_queue_slots(blocked_scheduler):
+    scheduler, release = blocked_scheduler
+    ran = []
+    queued = [scheduler.submit(lambda model: ran.append(model)) for _ in range(2)]
+    assert all(future.cancel() for future in queued)
+    assert scheduler.stats()["queue_depth"] == 0
+    # The cancelled jobs no longer count against max_queue
+    fresh = [scheduler.submit(lambda model: ran.append("fresh")) for _ in range(2)]
+    release.set()
+    for future in fresh:
+        future.result(5)
+    assert ran == ["fresh", "fresh"]
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_run_awaits_the_result():
+    scheduler = InferenceScheduler("test", lambda i: f"model-{i}", workers=2)
+    assert asyncio.run(scheduler.run(lambda model: model.upper(), timeout=1)).startswith("MODEL-")
+    assert scheduler.stats()["completed"] == 1
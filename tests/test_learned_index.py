@@ -0,0 +1,20 @@
+from learned_index import LearnedAnswerIndex
+
+
+def test_lookup_prefers_longest_then_newest_phrase():
+    index = LearnedAnswerIndex()
+    index.upsert("a", {"question": "gift cards", "answer": "Yes."})
+    index.upsert("b", {"question": "do you sell gift cards", "answer": "Yes, at the desk."})
+    assert index.lookup("Hi, do you sell gift cards?")["id"] == "b"
+    assert index.lookup("Gift cards?")["id"] == "a"
+    assert index.lookup("Is there parking?") is None
+
+
+def test_blank_update_removes_the_entry_and_bumps_the_version():
+    index = LearnedAnswerIndex()
+    index.upsert("a", {"question": "Do you sell gift cards?", "answer": "Yes."})
+    version = index.version
+    index.upsert("a", {"question": "?!", "answer": "Yes."})
+    assert index.version > version
+    assert index.lookup("Do you sell gift cards?") is None
+    assert len(index) == 0
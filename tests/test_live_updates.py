@@ -0,0 +1,70 @@
+import pytest
+
+from live_updates import ChangeCoalescer
+
+
+@pytest.fixture
+def coalescer():
+    sent = []
+    coalescer = ChangeCoalescer(sent.append, history=3)
+    coalescer.sent = sent
+    return coalescer
+
+
+def test_changes_within_a_window_are_merged_per_request(coalescer):
+    coalescer.add("upsert", "r1", {"question": "hours?"})
+    coalescer.add("upsert", "r2", {"question": "parking?"})
+    coalescer.add("remove", "r1")
+    message = coalescer.flush()
+    assert coalescer.sent == [message]
+    assert message["seq"] == 1 and message["epoch"] == coalescer.epoch
+    assert message["changes"] == [
+        {"op": "remove", "id": "r1", "request": None},
+        {"op": "upsert", "id": "r2", "request": {"question": "parking?"}},
+    ]
+
+
+def test_nothing_is_sent_without_changes(coalescer):
+    assert coalescer.flush() is None
+    assert coalescer.sent == [] and coalescer.seq == 0
+
+
+def test_reconnecting_client_gets_missed_messages(coalescer):
+    for request_id in ("r1", "r2", "r3"):
+        coalescer.add("upsert", request_id, {})
+        coalescer.flush()
+    assert [m["seq"] for m in coalescer.since(coalescer.epoch, 1)] == [2, 3]
+    assert coalescer.since(coalescer.epoch, 3) == []
+
+
+def test_client_reloads_after_restart_or_when_history_is_gone(coalescer):
+    for i in range(5):
+        coalescer.add("upsert", f"r{i}", {})
+        coalescer.flush()
+    # Only seq 3..5 are kept
+    assert coalescer.since(coalescer.epoch, 1) is None
+    assert [m["seq"] for m in coalescer.since(coalescer.epoch, 2)] == [3, 4, 5]
+    assert coalescer.since("old-epoch", 5) is None
+    assert coalescer.since(None, 0) is None
+
+
+def test_run_flushes_every_window_and_survives_emit_errors():
+    calls = []
+
+    def emit(message):
+        calls.append(message)
+        raise ConnectionError("socket closed")
+
+    coalescer = ChangeCoalescer(emit, window=0.5)
+    ticks = []
+
+    def sleep(seconds):
+        ticks.append(seconds)
+        if len(ticks) > 2:
+            raise KeyboardInterrupt
+        coalescer.add("upsert", f"r{len(ticks)}", {})
+
+    with pytest.raises(KeyboardInterrupt):
+        coalescer.run(sleep=sleep)
+    assert ticks == [0.5, 0.5, 0.5]
+    assert [m["seq"] for m in calls] == [1, 2]
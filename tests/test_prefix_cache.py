@@ -0,0 +1,37 @@
+from prefix_cache import SessionStateCache
+
+
+class _State:
+    def __init__(self, size):
+        self.llama_state_size = size
+
+
+def test_only_newer_snapshots_of_open_sessions_are_wanted():
+    cache = SessionStateCache(max_bytes=1000)
+    assert not cache.wants("s1", 1)
+    cache.open("s1")
+    assert cache.wants("s1", 1)
+    cache.put("s1", 1, _State(10))
+    assert not cache.wants("s1", 1)
+    assert cache.wants("s1", 2)
+    cache.close("s1")
+    assert not cache.wants("s1", 2)
+
+
+def test_saving_can_be_turned_off():
+    cache = SessionStateCache(max_bytes=0)
+    cache.open("s1")
+    assert not cache.wants("s1", 1)
+
+
+def test_evicts_least_recently_used():
+    cache = SessionStateCache(max_bytes=25)
+    for session_id in ("a", "b", "c"):
+        cache.open(session_id)
+    cache.put("a", 1, _State(10))
+    cache.put("b", 1, _State(10))
+    cache.get("a")
+    cache.put("c", 1, _State(10))
+    assert cache.get("b") == (-1, None)
+    assert cache.get("a")[0] == 1
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,39 @@
+import threading
+import time
+
+from learned_index import LearnedAnswerIndex
+from retrieval import Retriever
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_first_build_is_synchronous():
+    retriever = Retriever(LearnedAnswerIndex())
+    hits = retriever.search("What are your hours on Saturday?")
+    assert hits and hits[0][1]["topic"] == "hours"
+
+
+def test_rebuild_happens_in_the_background_and_swaps_in():
+    index = LearnedAnswerIndex()
+    retriever = Retriever(index)
+    before = retriever.search("parking near the salon")
+
+    release = threading.Event()
+    build = retriever._build
+    retriever._build = lambda: release.wait(5) and build()
+    index.upsert("p1", {"question": "Is there parking near the salon?", "answer": "Yes, behind the building."})
+
+    # Queries are served from the previous matrix while the new one is built
+    assert retriever.search("parking near the salon") == before
+    assert retriever.search("parking near the salon") == before
+    assert retriever.built_for() != retriever.fingerprint()
+    release.set()
+    assert _wait_for(lambda: any(doc.get("id") == "p1" for _, doc in retriever.search("parking near the salon")))
+    assert _wait_for(lambda: retriever.built_for() == retriever.fingerprint())
@@ -0,0 +1,56 @@
+import pytest
+
+from learned_index import LearnedAnswerIndex
+from retrieval import Retriever
+from router import (ROUTE_ESCALATE, ROUTE_LEARNED, ROUTE_LLM, Router, decide)
+
+
+@pytest.fixture
+def router():
+    return Router(retriever=Retriever(LearnedAnswerIndex()), log_path="")
+
+
+@pytest.mark.parametrize("question", [
+    "When do you close?",
+    "What time do you open tomorrow?",
+    "Can I reschedule my appointment?",
+    "Can I come in today?",
+    "Do you have any openings this afternoon?",
+    "How long does a color take?",
+    "What are your hours?",
+])
+def test_salon_questions_go_to_the_llm(router, question):
+    assert router.route(question).route == ROUTE_LLM
+
+
+@pytest.mark.parametrize("question", [
+    "I want a refund for my haircut",
+    "Can I speak to someone in charge?",
+    "I'm allergic to hair dye",
+])
+def test_keywords_escalate(router, question):
+    decision = router.route(question)
+    assert (decision.route, decision.reason) == (ROUTE_ESCALATE, "keyword")
+
+
+def test_learned_answer_is_spoken_directly():
+    index = LearnedAnswerIndex()
+    index.upsert("a1", {"question": "Do you sell gift cards?", "answer": "Yes, at the front desk."})
+    router = Router(retriever=Retriever(index), log_path="")
+    decision = router.route("do you sell gift cards")
+    assert decision.route == ROUTE_LEARNED
+    assert decision.answer == "Yes, at the front desk."
+
+
+def test_decide_score_gate_is_opt_in():
+    features = {"content_words": 3, "top_score": 0.0}
+    assert decide(features) == (ROUTE_LLM, "in_scope")
+    assert decide(features, min_score=0.1) == (ROUTE_ESCALATE, "out_of_scope")
+    assert decide({"content_words": 1, "smalltalk": True, "top_score": 0.0}, min_score=0.1) == (ROUTE_LLM, "smalltalk")
+
+
+def test_decide_order():
+    assert decide({"keyword": True, "learned_exact": True})[0] == ROUTE_ESCALATE
+    assert decide({"learned_score": 0.99, "p_escalate": 0.9})[0] == ROUTE_LEARNED
+    assert decide({"content_words": 3, "p_escalate": 0.9, "classifier_threshold": 0.5}) == (ROUTE_ESCALATE, "classifier")
+    assert decide({"content_words": 3, "p_escalate": 0.1}, min_score=0.5) == (ROUTE_LLM, "classifier")
@@ -0,0 +1,78 @@
+import numpy as np
+
+from segmenter import UtteranceSegmenter
+
+RATE = 16000
+
+
+def _silence(seconds):
+    return np.zeros(int(RATE * seconds), dtype=np.int16)
+
+
+def _tone(seconds, amplitude=8000):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def _push_in_chunks(segmenter, audio, chunk=333):
+    # An odd chunk size exercises the partial-frame carry-over
+    utterances = []
+    for i in range(0, len(audio), chunk):
+        utterances.extend(segmenter.push(audio[i:i + chunk]))
+    return utterances
+
+
+def test_endpoints_after_hangover_and_trims_it():
+    segmenter = UtteranceSegmenter(hangover_ms=600, pre_roll_ms=200)
+    audio = np.concatenate([_silence(0.5), _tone(1.0), _silence(1.0)])
+    utterances = _push_in_chunks(segmenter, audio)
+    assert len(utterances) == 1
+    # One second of speech plus the pre-roll, without the trailing silence
+    assert abs(len(utterances[0]) - int(1.2 * RATE)) <= segmenter.frame_size
+    assert not segmenter.in_speech
+
+
+def test_short_pause_does_not_split_an_utterance():
+    segmenter = UtteranceSegmenter(hangover_ms=600)
+    audio = np.concatenate([_tone(0.5), _silence(0.3), _tone(0.5), _silence(1.0)])
+    assert len(_push_in_chunks(segmenter, audio)) == 1
+
+
+def test_two_utterances_separated_by_silence():
+    segmenter = UtteranceSegmenter(hangover_ms=300)
+    audio = np.concatenate([_tone(0.5), _silence(0.8), _tone(0.5), _silence(0.8)])
+    assert len(_push_in_chunks(segmenter, audio)) == 2
+
+
+def test_blips_below_min_speech_are_dropped():
+    segmenter = UtteranceSegmenter(min_speech_ms=200, hangover_ms=300)
+    audio = np.concatenate([_silence(0.2), _tone(0.06), _silence(1.0)])
+    assert _push_in_chunks(segmenter, audio) == []
+
+
+def test_max_length_forces_an_endpoint():
+    segmenter = UtteranceSegmenter(max_utterance_s=1.0, pre_roll_ms=0)
+    utterances = _push_in_chunks(segmenter, _tone(2.5))
+    assert len(utterances) == 2
+    assert all(len(u) == RATE for u in utterances)
+
+
+def test_in_progress_utterance_and_flush():
+    segmenter = UtteranceSegmenter(pre_roll_ms=0)
+    _push_in_chunks(segmenter, _tone(0.5))
+    assert segmenter.in_speech
+    assert segmenter.utterance_samples == int(0.5 * RATE)
+    assert segmenter.voiced_samples == int(0.5 * RATE)
+    assert len(segmenter.current_utterance()) == int(0.5 * RATE)
+    assert len(segmenter.flush()) == int(0.5 * RATE)
+    assert segmenter.current_utterance() is None
+
+
+def test_background_noise_alone_is_not_speech():
+    rng = np.random.default_rng(0)
+    segmenter = UtteranceSegmenter(hangover_ms=300)
+    noise = rng.normal(0, 150, RATE * 2).astype(np.int16)
+    assert _push_in_chunks(segmenter, noise) == []
+    audio = noise.copy()
+    audio[RATE // 2:RATE] += _tone(0.5, amplitude=6000)
+    assert len(_push_in_chunks(segmenter, audio)) == 1
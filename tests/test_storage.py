@@ -0,0 +1,136 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import HISTORY_FIELDS, new_help_request
+from storage import RequestNotPending, SqliteStorage
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return SqliteStorage(str(tmp_path / "frontdesk.db"), poll_interval=0.01)
+
+
+def _add(storage, request_id, question="What are your hours?", caller_id="caller", minutes=0,
+         expires_in=30, status="pending"):
+    request = new_help_request(question, caller_id)
+    request.update(created_at=T0 + timedelta(minutes=minutes),
+                   expires_at=T0 + timedelta(minutes=minutes + expires_in), status=status)
+    storage.add_help_request(request_id, request)
+
+
+class _Collector:
+    def __init__(self):
+        self.batches = []
+        self._event = threading.Event()
+
+    def __call__(self, changes):
+        self.batches.append(changes)
+        self._event.set()
+
+    def wait(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.batches) < count and time.monotonic() < deadline:
+            self._event.wait(0.01)
+            self._event.clear()
+        return len(self.batches) >= count
+
+
+def test_pending_requests_page_by_expiry(storage):
+    for i in range(5):
+        _add(storage, f"r{i}", minutes=i)
+    _add(storage, "stale", minutes=-60)
+    _add(storage, "done", minutes=1, status="resolved")
+
+    now = T0 + timedelta(minutes=1)
+    pages, after = [], None
+    while True:
+        page = storage.pending_requests(now, 2, after)
+        pages.append([request["id"] for request in page])
+        if len(page) < 2:
+            break
+        after = page[-1]["id"]
+    assert pages == [["r0", "r1"], ["r2", "r3"], ["r4"]]
+
+    assert storage.expire_stale_requests(now, 10) == 1
+    assert storage.get_help_request("stale")["status"] == "expired"
+
+
+def test_history_is_newest_first_projected_and_filtered(storage):
+    for i in range(5):
+        _add(storage, f"r{i}", question=f"Question {i}?", caller_id="a" if i % 2 else "b", minutes=i)
+    storage.resolve_help_request("r4", "We open at 9.", T0)
+
+    first = storage.request_history(2, HISTORY_FIELDS)
+    assert [request["id"] for request in first] == ["r4", "r3"]
+    assert set(first[0]) == {"id", *HISTORY_FIELDS}
+    second = storage.request_history(2, HISTORY_FIELDS, start_after="r3")
+    assert [request["id"] for request in second] == ["r2", "r1"]
+
+    assert [r["id"] for r in storage.request_history(10, HISTORY_FIELDS, caller_id="a")] == ["r3", "r1"]
+    assert [r["id"] for r in storage.request_history(10, HISTORY_FIELDS, status="resolved")] == ["r4"]
+
+
+def test_attach_and_resolve_answers_every_caller(storage):
+    _add(storage, "r1", question="Do you sell gift cards?", caller_id="a")
+    _add(storage, "r2", question="do you sell gift cards", caller_id="c")
+    assert storage.attach_caller("r1", "b", T0)
+    assert storage.attach_caller("r1", "b", T0)
+
+    assert storage.resolve_help_request("r1", "Yes, at the front desk.", T0) == ["a", "b", "c"]
+    assert storage.get_help_request("r2")["duplicate_of"] == "r1"
+    assert not storage.attach_caller("r1", "d", T0)
+    assert [a["answer"] for a in storage.learned_answers(10)] == ["Yes, at the front desk."]
+
+    # Answering again must not add a second learned answer
+    with pytest.raises(RequestNotPending):
+        storage.resolve_help_request("r1", "No.", T0)
+    with pytest.raises(RequestNotPending):
+        storage.resolve_help_request("missing", "No.", T0)
+    assert len(storage.learned_answers(10)) == 1
+
+
+def test_history_by_caller_includes_attached_callers(storage):
+    _add(storage, "r1", question="Do you sell gift cards?", caller_id="a")
+    _add(storage, "r2", question="Is there parking?", caller_id="b", minutes=1)
+    storage.attach_caller("r1", "b", T0)
+    assert [r["id"] for r in storage.request_history(10, HISTORY_FIELDS, caller_id="b")] == ["r2", "r1"]
+    assert [r["id"] for r in storage.request_history(10, HISTORY_FIELDS, caller_id="a")] == ["r1"]
+
+
+def test_pending_watch_delivers_initial_state_then_changes(storage):
+    _add(storage, "r1")
+    collector = _Collector()
+    watch = storage.watch_pending_requests(collector)
+    try:
+        assert collector.wait(1)
+        assert [(op, request_id) for op, request_id, _ in collector.batches[0]] == [("upsert", "r1")]
+
+        _add(storage, "r2", question="Is there parking?")
+        assert collector.wait(2)
+        assert [(op, request_id) for op, request_id, _ in collector.batches[1]] == [("upsert", "r2")]
+
+        storage.resolve_help_request("r1", "We open at 9.", T0)
+        assert collector.wait(3)
+        assert [(op, request_id) for op, request_id, _ in collector.batches[2]] == [("remove", "r1")]
+    finally:
+        watch.unsubscribe()
+
+
+def test_learned_answer_watch_follows_resolutions(storage):
+    collector = _Collector()
+    watch = storage.watch_learned_answers(collector)
+    try:
+        assert collector.wait(1)
+        assert collector.batches[0] == []
+        _add(storage, "r1", question="Do you sell gift cards?")
+        storage.resolve_help_request("r1", "Yes.", T0)
+        assert collector.wait(2)
+        (op, _, data), = collector.batches[1]
+        assert op == "upsert" and data["question"] == "Do you sell gift cards?"
+    finally:
+        watch.unsubscribe()
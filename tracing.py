@@ -0,0 +1,112 @@
+"""Per-turn latency spans.
+
+A turn runs from the end of a caller utterance to the end of the reply.
+Pipeline code wraps each stage in `span("stt")`, `span("lookup")`, ...;
+every span is observed in the `frontdesk_stage_seconds{stage}` histogram
+and, when it runs inside a `Turn`, added to that turn's breakdown, which
+is logged as one line when the turn ends. The current turn follows the
+asyncio task through a ContextVar, so code in llm.py and tts.py needs no
+extra arguments; work done on other threads reports back with `record`.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger("tracing")
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "frontdesk_stage_seconds", "Latency of each pipeline stage", ["stage"]
+)
+TURN_SECONDS = REGISTRY.histogram(
+    "frontdesk_turn_seconds", "End of caller utterance to end of reply", ["outcome"]
+)
+FIRST_AUDIO_SECONDS = REGISTRY.histogram(
+    "frontdesk_first_audio_seconds", "End of caller utterance to the first reply audio"
+)
+REAL_TIME_FACTOR = REGISTRY.histogram(
+    "frontdesk_real_time_factor", "Processing time divided by audio duration", ["stage"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+)
+
+_current_turn: ContextVar[Optional["Turn"]] = ContextVar("current_turn", default=None)
+
+
+def current_turn() -> Optional["Turn"]:
+    return _current_turn.get()
+
+
+def set_outcome(outcome: str):
+    """Label the current turn ("answered", "escalated", "shed", "error", ...)."""
+    turn = _current_turn.get()
+    if turn is not None:
+        turn.outcome = outcome
+
+
+def record(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    turn = _current_turn.get()
+    if turn is not None:
+        turn.stages[stage] = turn.stages.get(stage, 0.0) + seconds
+
+
+def record_rtf(stage: str, seconds: float, audio_seconds: float):
+    if audio_seconds > 0:
+        REAL_TIME_FACTOR.observe(seconds / audio_seconds, stage=stage)
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def stage_summary() -> Dict[str, dict]:
+    """count/mean/p50/p95/p99 of every stage seen so far, for logging."""
+    return {
+        labels["stage"]: STAGE_SECONDS.summary(**labels)
+        for labels in STAGE_SECONDS.label_values()
+    }
+
+
+class Turn:
+    """Context manager that collects the spans of one caller turn."""
+
+    def __init__(self, caller_id: str, audio_seconds: float = 0.0):
+        self.caller_id = caller_id
+        self.audio_seconds = audio_seconds
+        self.outcome = "answered"
+        self.stages: Dict[str, float] = {}
+        self.first_audio: Optional[float] = None
+        self._start = 0.0
+        self._token = None
+
+    def mark_first_audio(self):
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter() - self._start
+            FIRST_AUDIO_SECONDS.observe(self.first_audio)
+
+    def __enter__(self) -> "Turn":
+        self._start = time.perf_counter()
+        self._token = _current_turn.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_turn.reset(self._token)
+        total = time.perf_counter() - self._start
+        if exc_type is not None and self.outcome == "answered":
+            self.outcome = "error"
+        TURN_SECONDS.observe(total, outcome=self.outcome)
+        breakdown = " ".join(f"{stage}={seconds:.3f}s" for stage, seconds in self.stages.items())
+        first_audio = f"{self.first_audio:.3f}s" if self.first_audio is not None else "-"
+        logger.info(
+            f"Turn ({self.caller_id}, {self.outcome}): total={total:.3f}s first_audio={first_audio} "
+            f"audio={self.audio_seconds:.2f}s {breakdown}"
+        )
+        return False
@@ -1,21 +1,163 @@
-from gtts import gTTS
+import asyncio
+import logging
 import os
-import io
-from livekit.agents import AudioFrame
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from livekit import rtc
+from scipy.signal import resample_poly
+
+from tracing import current_turn, record_rtf, span
+
+logger = logging.getLogger("tts")
+
+OUTPUT_SAMPLE_RATE = 24000
+FRAME_MS = 20
+
+
+class Pyttsx3Engine:
+    """Offline synthesis through pyttsx3 (espeak/SAPI/NSSpeechSynthesizer)."""
+
+    def __init__(self, voice: Optional[str] = None, rate: int = 175):
+        import pyttsx3
+        self._engine = pyttsx3.init()
+        self._engine.setProperty("rate", rate)
+        if voice:
+            self._engine.setProperty("voice", voice)
+        self.voice = voice or self._engine.getProperty("voice")
+        # pyttsx3 drives a single native engine that isn't re-entrant
+        self._lock = threading.Lock()
+
+    def synthesize(self, text: str) -> Tuple[np.ndarray, int]:
+        """Render `text` to 16-bit mono PCM; returns (samples, sample_rate)."""
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            with self._lock:
+                self._engine.save_to_file(text, path)
+                self._engine.runAndWait()
+            with wave.open(path, "rb") as wav:
+                channels = wav.getnchannels()
+                rate = wav.getframerate()
+                samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+            if channels > 1:
+                samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+            return samples, rate
+        finally:
+            os.remove(path)
+
 
 class TTSHandler:
+    """Turns text into 20 ms PCM frames, with an LRU cache of rendered audio.
+
+    Rendered audio is cached per (voice, text) at the output sample rate, up
+    to `cache_bytes`. Fixed phrases (greeting, escalation reply, ...) can be
+    rendered ahead of time with `prerender`; those are pinned outside the LRU
+    so speaking them never costs synthesis time.
+    """
+
+    def __init__(self, engine=None, cache_bytes: int = 32 * 1024 * 1024):
+        self.engine = engine or Pyttsx3Engine(voice=os.getenv("TTS_VOICE"))
+        self.cache_bytes = cache_bytes
+        self._cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._cache_size = 0
+        self._pinned = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.frame_size = OUTPUT_SAMPLE_RATE * FRAME_MS // 1000
+
+    def cached(self, text: str) -> Optional[np.ndarray]:
+        key = (self.engine.voice, text.strip())
+        with self._lock:
+            audio = self._pinned.get(key)
+            if audio is None:
+                audio = self._cache.get(key)
+                if audio is not None:
+                    self._cache.move_to_end(key)
+            if audio is not None:
+                self.hits += 1
+            return audio
+
+    def render(self, text: str) -> np.ndarray:
+        """Audio for `text` at OUTPUT_SAMPLE_RATE, from cache when possible."""
+        audio = self.cached(text)
+        if audio is not None:
+            return audio
+        key = (self.engine.voice, text.strip())
+        with self._lock:
+            self.misses += 1
+
+        start = time.perf_counter()
+        samples, rate = self.engine.synthesize(key[1])
+        record_rtf("tts", time.perf_counter() - start, len(samples) / rate)
+        if rate != OUTPUT_SAMPLE_RATE:
+            samples = resample_poly(samples.astype(np.float32), OUTPUT_SAMPLE_RATE, rate)
+            samples = np.clip(samples, -32768, 32767).astype(np.int16)
+
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = samples
+                self._cache_size += samples.nbytes
+                while self._cache_size > self.cache_bytes and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_size -= evicted.nbytes
+        return samples
+
+    def prerender(self, phrases: Iterable[str]):
+        for phrase in phrases:
+            audio = self.render(phrase)
+            with self._lock:
+                self._pinned[(self.engine.voice, phrase.strip())] = audio
+        logger.info(f"Pre-rendered {len(self._pinned)} TTS phrases")
+
+    def frames(self, audio: np.ndarray):
+        """Split audio into 20 ms AudioFrames, zero-padding the last one."""
+        for start in range(0, len(audio), self.frame_size):
+            chunk = audio[start:start + self.frame_size]
+            if len(chunk) < self.frame_size:
+                chunk = np.pad(chunk, (0, self.frame_size - len(chunk)))
+            yield rtc.AudioFrame(
+                data=chunk.tobytes(),
+                sample_rate=OUTPUT_SAMPLE_RATE,
+                num_channels=1,
+                samples_per_channel=self.frame_size
+            )
+
     async def say(self, text, session):
-        tts = gTTS(text=text, lang="en")
-        mp3_fp = io.BytesIO()
-        tts.write_to_fp(mp3_fp)
-        mp3_fp.seek(0)
-        
-        # Convert to raw audio (simplified - use proper audio decoding)
-        raw_audio = mp3_fp.read()
-        frame = AudioFrame(
-            data=raw_audio,
-            sample_rate=24000,
-            num_channels=1,
-            samples_per_channel=len(raw_audio)//2
-        )
-        await session.audio.write_frame(frame)
\ No newline at end of file
+        with span("tts"):
+            audio = self.cached(text)
+            if audio is None:
+                loop = asyncio.get_event_loop()
+                audio = await loop.run_in_executor(None, self.render, text)
+        turn = current_turn()
+        if turn is not None:
+            turn.mark_first_audio()
+        with span("playback"):
+            try:
+                for frame in self.frames(audio):
+                    await session.audio.write_frame(frame)
+            except asyncio.CancelledError:
+                # Barge-in: also drop audio already buffered in the output track
+                clear_queue = getattr(session.audio, "clear_queue", None)
+                if clear_queue is not None:
+                    clear_queue()
+                raise
+
+
+_handler: Optional[TTSHandler] = None
+_handler_lock = threading.Lock()
+
+
+def get_tts_handler() -> TTSHandler:
+    """Process-wide TTS handler, so every session shares the phrase cache."""
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            _handler = TTSHandler(cache_bytes=int(os.getenv("TTS_CACHE_MB", "32")) * 1024 * 1024)
+        return _handler
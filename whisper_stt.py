@@ -1,16 +1,106 @@
-import whisper
 import numpy as np
 import logging
+import re
+from typing import List, Tuple
+from stt_service import get_stt_service
 
 class WhisperSTT:
     def __init__(self):
-        self.model = whisper.load_model("base")
-        logging.info("Whisper model loaded")
+        self.model = get_stt_service()
+        logging.info("Using shared Whisper STT service")
 
     async def transcribe(self, audio_frame):
         # Convert LiveKit audio frame to numpy array
         audio_data = np.frombuffer(audio_frame.data, dtype=np.int16)
         audio_data = audio_data.astype(np.float32) / 32768.0  # Normalize
-        
+
         result = self.model.transcribe(audio_data, language="en")
-        return result["text"].strip()
\ No newline at end of file
+        return result["text"].strip()
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+class StreamingTranscriber:
+    """Incremental transcription of a single growing utterance.
+
+    Each `update` re-decodes only the audio after the last committed word.
+    Words that two consecutive hypotheses agree on (local agreement) are
+    committed and the window start moves past them, so the decoded window
+    stays short however long the caller talks. `finalize` decodes the
+    uncommitted tail once the utterance has ended; it is decoded without a
+    prompt so tails from concurrent sessions can share one batched pass.
+    """
+
+    def __init__(self, model, sample_rate: int = 16000, min_window_s: float = 0.5):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.min_window = int(sample_rate * min_window_s)
+        self.reset()
+
+    def reset(self):
+        self._committed_words: List[str] = []
+        self._committed_samples = 0
+        self._previous: List[Tuple[str, float]] = []
+
+    @property
+    def committed_text(self) -> str:
+        return "".join(self._committed_words).strip()
+
+    def update(self, audio: np.ndarray) -> Tuple[str, str]:
+        """Decode the newest audio; returns (committed_text, partial_text).
+
+        `audio` is the whole utterance so far as float32 in [-1, 1].
+        """
+        window = audio[self._committed_samples:]
+        if len(window) < self.min_window:
+            return self.committed_text, ""
+
+        words = self._decode_words(window)
+        agreed = 0
+        for (prev, _), (word, _) in zip(self._previous, words):
+            if _normalize_word(prev) != _normalize_word(word):
+                break
+            agreed += 1
+
+        if agreed:
+            commit_end = words[agreed - 1][1]
+            self._committed_words.extend(word for word, _ in words[:agreed])
+            self._committed_samples += int(commit_end * self.sample_rate)
+            # Keep the rest of this hypothesis, re-based on the new window start
+            self._previous = [(word, end - commit_end) for word, end in words[agreed:]]
+        else:
+            self._previous = words
+
+        partial = "".join(word for word, _ in self._previous).strip()
+        return self.committed_text, partial
+
+    def finalize(self, audio: np.ndarray) -> str:
+        """Decode whatever is left after the committed prefix and reset."""
+        tail = audio[self._committed_samples:]
+        text = self.committed_text
+        if len(tail) >= self.sample_rate // 10:
+            result = self.model.transcribe(
+                tail,
+                language="en",
+                fp16=False
+            )
+            text = f"{text} {result['text'].strip()}".strip()
+        self.reset()
+        return text
+
+    def _decode_words(self, window: np.ndarray) -> List[Tuple[str, float]]:
+        result = self.model.transcribe(
+            window,
+            language="en",
+            fp16=False,
+            word_timestamps=True,
+            initial_prompt=self.committed_text or None,
+            condition_on_previous_text=False
+        )
+        return [
+            (word["word"], word["end"])
+            for segment in result.get("segments", [])
+            for word in segment.get("words", [])
+        ]